@@ -0,0 +1,196 @@
+import librosa
+import numpy as np
+import torch
+from scipy.ndimage import median_filter
+
+from .audio import WHISPER_SAMPLES_PER_ENCODER_FRAME, SAMPLE_RATE
+from .model_registry import get_whisper
+from .utils import GentleClient, encode_audio
+
+# -----------------------
+# Forced alignment backends
+# -----------------------
+# "whisper": align the reference text locally with the Whisper model already
+#            loaded for ASR (cross-attention + DTW), inside the analysis worker
+# "gentle":  post the audio to the remote Gentle server
+ALIGNMENT_BACKEND = "whisper"
+
+SECONDS_PER_ENCODER_FRAME = WHISPER_SAMPLES_PER_ENCODER_FRAME / SAMPLE_RATE  # 0.02 s
+ALIGNMENT_MEDIAN_FILTER_WIDTH = 7
+# DTW paths can step vertically, which gives words no frames of their own;
+# every aligned word lasts at least one encoder frame
+MIN_WORD_DURATION = SECONDS_PER_ENCODER_FRAME
+
+
+class GentleAligner:
+    """
+    Remote alignment through Gentle, over a pooled async HTTP client.
+    Runs concurrently with the ASR stage.
+    """
+    in_process = False
+
+    def __init__(self):
+        self.client = GentleClient()
+
+    async def start(self):
+        await self.client.start()
+
+    async def close(self):
+        await self.client.close()
+
+    async def align(self, data, filename, transcript):
+        return await self.client.align(data, filename, transcript)
+
+
+class WhisperAligner:
+    """
+    Local alignment with the service's own Whisper model. It needs the
+    encoder outputs of the ASR stage, so it runs inside the analysis worker
+    (see pipeline.analyze_audio). Clips longer than one 30-second window
+    cannot be aligned locally; the worker flags them and align() sends
+    them to Gentle instead.
+    """
+    in_process = True
+
+    def __init__(self):
+        self.fallback = GentleAligner()
+
+    async def start(self):
+        await self.fallback.start()
+
+    async def close(self):
+        await self.fallback.close()
+
+    async def align(self, data, filename, transcript):
+        return await self.fallback.align(data, filename, transcript)
+
+
+def create_aligner(backend=ALIGNMENT_BACKEND):
+    if backend == "gentle":
+        return GentleAligner()
+    if backend == "whisper":
+        return WhisperAligner()
+    raise ValueError(f"Unknown alignment backend: {backend}")
+
+
+def _alignment_heads(model):
+    heads = getattr(model.generation_config, "alignment_heads", None)
+    if heads:
+        return [tuple(h) for h in heads]
+    # Without tuned heads, use every head of the upper half of the decoder (as openai-whisper does)
+    layers = model.config.decoder_layers
+    return [(layer, head) for layer in range(layers // 2, layers)
+            for head in range(model.config.decoder_attention_heads)]
+
+
+def _cross_attention_weights(model, encoder_hidden_states, tokens, heads):
+    """
+    Cross-attention weights (len(heads), len(tokens), num_frames) for the
+    requested (layer, head) pairs under teacher forcing. They are computed
+    from the captured attention inputs, so this works with any attention
+    implementation, including SDPA, which does not return weights.
+    """
+    layers = sorted({layer for layer, _ in heads})
+    captured = {}
+    hooks = []
+
+    def capture(layer):
+        def hook(module, args, kwargs):
+            hidden = kwargs["hidden_states"] if "hidden_states" in kwargs else args[0]
+            captured[layer] = hidden
+        return hook
+
+    decoder_layers = model.model.decoder.layers
+    for layer in layers:
+        hooks.append(decoder_layers[layer].encoder_attn.register_forward_pre_hook(capture(layer), with_kwargs=True))
+    try:
+        with torch.no_grad():
+            model.model.decoder(
+                input_ids=torch.tensor([tokens]),
+                encoder_hidden_states=encoder_hidden_states,
+                use_cache=False,
+            )
+
+            per_layer = {}
+            for layer in layers:
+                attn = decoder_layers[layer].encoder_attn
+                q = attn.q_proj(captured[layer])          # (1, T, D)
+                k = attn.k_proj(encoder_hidden_states)    # (1, F, D)
+                q = q.view(1, -1, attn.num_heads, attn.head_dim).transpose(1, 2)
+                k = k.view(1, -1, attn.num_heads, attn.head_dim).transpose(1, 2)
+                per_layer[layer] = torch.softmax((q @ k.transpose(-1, -2)) * attn.head_dim ** -0.5, dim=-1)[0]
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+    return torch.stack([per_layer[layer][head] for layer, head in heads])
+
+
+def _split_words(tokenizer, text_tokens):
+    # A token that starts with a space begins a new word
+    words, word_tokens = [], []
+    for token in text_tokens:
+        piece = tokenizer.decode([token])
+        if not word_tokens or piece.startswith(" "):
+            words.append(piece)
+            word_tokens.append([token])
+        else:
+            words[-1] += piece
+            word_tokens[-1].append(token)
+    return words, word_tokens
+
+
+def can_align_locally(audio):
+    # Decoder positions are limited, and the text must be aligned inside one 30-second window
+    return len(audio.windows()) == 1
+
+
+def whisper_forced_alignment(audio, transcript):
+    """
+    Aligns `transcript` to the audio with Whisper cross-attention and DTW
+    (the approach of openai-whisper's word timestamps). The result has
+    Gentle's shape: {"transcript": ..., "words": [{"word", "start", "end", "case"}]}.
+    Returns None when the clip or text cannot be aligned.
+    """
+    processor, model = get_whisper()
+    tokenizer = processor.tokenizer
+
+    if not can_align_locally(audio) or not transcript.strip():
+        return None
+
+    prompt = list(tokenizer.prefix_tokens)  # <|startoftranscript|> [lang] [task] <|notimestamps|>
+    text_tokens = tokenizer(" " + transcript.strip(), add_special_tokens=False).input_ids
+    tokens = prompt + text_tokens + [tokenizer.eos_token_id]
+    if not text_tokens or len(tokens) > model.config.max_target_positions:
+        return None
+
+    num_frames = int(audio.encoder_frame_mask()[0].sum())
+    encoder_hidden_states = encode_audio(audio)[:1]
+    weights = _cross_attention_weights(model, encoder_hidden_states, tokens, _alignment_heads(model))
+    weights = weights[:, :, :num_frames].float()
+
+    # Normalize each head over tokens, smooth over time, then average the heads
+    weights = (weights - weights.mean(dim=-2, keepdim=True)) / (weights.std(dim=-2, keepdim=True) + 1e-8)
+    weights = median_filter(weights.numpy(), size=(1, 1, ALIGNMENT_MEDIAN_FILTER_WIDTH))
+    # Rows that predict each text token, plus the one predicting end-of-text
+    matrix = weights.mean(axis=0)[len(prompt) - 1:-1]
+
+    _, path = librosa.sequence.dtw(C=-matrix.astype(np.float64), backtrack=True)
+    path = path[::-1]
+    text_indices, time_indices = path[:, 0], path[:, 1]
+
+    jumps = np.pad(np.diff(text_indices), (1, 0), constant_values=1).astype(bool)
+    jump_times = time_indices[jumps] * SECONDS_PER_ENCODER_FRAME
+
+    words, word_tokens = _split_words(tokenizer, text_tokens)
+    boundaries = np.pad(np.cumsum([len(t) for t in word_tokens]), (1, 0))
+    start_times, end_times = jump_times[boundaries[:-1]], jump_times[boundaries[1:]]
+    end_times = np.maximum(end_times, start_times + MIN_WORD_DURATION)
+
+    aligned = [
+        {"word": word.strip(), "alignedWord": word.strip().lower(), "case": "success",
+         "start": float(start), "end": float(end)}
+        for word, start, end in zip(words, start_times, end_times)
+        if any(ch.isalnum() for ch in word)
+    ]
+    return {"transcript": transcript, "words": aligned}
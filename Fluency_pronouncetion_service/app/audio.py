@@ -0,0 +1,170 @@
+import io
+import math
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import soundfile as sf
+import torch
+import torchaudio
+
+SAMPLE_RATE = 16000           # Whisper and the prosody features both work at 16 kHz
+WHISPER_WINDOW_SECONDS = 30   # Whisper encodes audio in fixed 30-second windows
+WHISPER_WINDOW_SAMPLES = WHISPER_WINDOW_SECONDS * SAMPLE_RATE
+WHISPER_NUM_FRAMES = 3000     # log-mel frames per window (hop of 160 samples)
+WHISPER_SAMPLES_PER_ENCODER_FRAME = 320  # the encoder downsamples log-mel frames by 2
+WHISPER_ENCODER_FRAMES = WHISPER_NUM_FRAMES // 2
+
+
+class AudioContext:
+    """
+    Decoded audio shared by every stage of one analysis request.
+
+    The file is decoded and resampled once to a 16 kHz mono float32 buffer.
+    Features derived from it (such as the Whisper log-mel spectrogram) are
+    computed on first use and cached on the context.
+
+    Clips longer than 30 seconds are split into consecutive 30-second
+    windows rather than truncated; each window becomes one row of the
+    Whisper batch.
+
+    Uploads are decoded from memory. The original encoded bytes are kept
+    for stages that need the file itself (e.g. forced alignment).
+    """
+
+    def __init__(self, waveform, path=None, data=None, filename=None):
+        self.waveform = waveform          # np.float32 array of shape (num_samples,)
+        self.sample_rate = SAMPLE_RATE
+        self.path = path
+        self.data = data                  # original encoded bytes, if decoded from memory
+        self.filename = filename or (os.path.basename(path) if path else "audio.wav")
+        self._input_features = None
+        self.encoder_hidden_states = None  # Whisper encoder output, filled in by utils.encode_audio
+
+    @staticmethod
+    def _to_mono_16k(waveform, sr):
+        # waveform: (channels, num_samples) float tensor
+        if sr != SAMPLE_RATE:
+            waveform = torchaudio.functional.resample(waveform, sr, SAMPLE_RATE)
+
+        if waveform.dim() > 1:
+            waveform = waveform.mean(dim=0)  # Convert to mono if needed
+
+        return waveform.numpy().astype(np.float32, copy=False)
+
+    @classmethod
+    def from_path(cls, audio_path):
+        waveform, sr = torchaudio.load(audio_path)
+        return cls(cls._to_mono_16k(waveform, sr), path=audio_path)
+
+    @classmethod
+    def from_bytes(cls, data, filename=None):
+        """
+        Decodes an uploaded file without writing it to disk. Formats that
+        libsndfile cannot read from memory (e.g. webm, mp3) go through a
+        unique temporary file that is always removed.
+        """
+        try:
+            samples, sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+            waveform = torch.from_numpy(samples.T.copy())  # (channels, num_samples)
+            return cls(cls._to_mono_16k(waveform, sr), data=data, filename=filename)
+        except (RuntimeError, TypeError):  # libsndfile cannot read this format
+            pass
+
+        context = cls(np.zeros(0, dtype=np.float32), data=data, filename=filename)
+        with context.temp_path() as path:
+            waveform, sr = torchaudio.load(path)
+        context.waveform = cls._to_mono_16k(waveform, sr)
+        return context
+
+    @contextmanager
+    def temp_path(self):
+        """
+        Yields a filesystem path holding the audio, for stages that need one.
+        In-memory audio is written to a uniquely named temporary file that
+        is deleted when the block exits, even on error.
+        """
+        if self.data is None:
+            yield self.path
+            return
+
+        suffix = os.path.splitext(self.filename)[1] or ".wav"
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix="fluency_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.data)
+            yield path
+        finally:
+            os.remove(path)
+
+    def read_bytes(self):
+        """
+        The encoded audio file, e.g. for uploading to an alignment service.
+        """
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    @property
+    def num_samples(self):
+        return self.waveform.shape[-1]
+
+    @property
+    def duration(self):
+        return self.num_samples / self.sample_rate
+
+    def windows(self):
+        """
+        The waveform split into consecutive 30-second windows (the last one may be shorter).
+        """
+        if self.num_samples == 0:
+            return [self.waveform]
+        return [self.waveform[start:start + WHISPER_WINDOW_SAMPLES]
+                for start in range(0, self.num_samples, WHISPER_WINDOW_SAMPLES)]
+
+    def window_durations(self):
+        return [len(window) / self.sample_rate for window in self.windows()]
+
+    def encoder_frame_mask(self):
+        """
+        Boolean mask of shape (num_windows, 1500) marking encoder frames that
+        cover real audio rather than the zero padding of a short window.
+        """
+        counts = [min(WHISPER_ENCODER_FRAMES, max(1, math.ceil(len(w) / WHISPER_SAMPLES_PER_ENCODER_FRAME)))
+                  for w in self.windows()]
+        frames = torch.arange(WHISPER_ENCODER_FRAMES)
+        return frames.unsqueeze(0) < torch.tensor(counts).unsqueeze(1)
+
+    def input_features(self, processor):
+        """
+        Whisper log-mel features of shape (num_windows, feature_size, 3000), computed once.
+        Each window is featurized on its own samples (padding=True) and its
+        features zero-padded to 3000 frames, exactly as the scoring models'
+        training inputs were; padding the audio with silence instead would
+        change both the padded and the real frames.
+        """
+        if self._input_features is None:
+            windows = []
+            for window in self.windows():
+                inputs = processor(
+                    window,
+                    sampling_rate=self.sample_rate,
+                    return_tensors="pt",
+                    padding=True
+                )
+                input_features = inputs.input_features  # (1, feature_size, time)
+
+                # Ensure the time dimension is exactly 3000
+                current_length = input_features.shape[-1]
+                if current_length < WHISPER_NUM_FRAMES:
+                    pad_amount = WHISPER_NUM_FRAMES - current_length
+                    input_features = torch.nn.functional.pad(input_features, (0, pad_amount), mode="constant", value=0)
+                elif current_length > WHISPER_NUM_FRAMES:
+                    input_features = input_features[:, :, :WHISPER_NUM_FRAMES]
+                windows.append(input_features)
+            input_features = torch.cat(windows)
+
+            self._input_features = input_features
+        return self._input_features
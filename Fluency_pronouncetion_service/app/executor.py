@@ -0,0 +1,107 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import torch
+
+from .model_registry import preload_models
+
+# -----------------------
+# Execution layer settings
+# -----------------------
+EXECUTOR_MODE = "process"      # "process": worker processes own the models; "thread": share this process's models
+EXECUTOR_WORKERS = 2           # analyses that run at the same time
+MAX_QUEUED_REQUESTS = 8        # admitted requests allowed to wait for a worker; more are rejected
+TORCH_THREADS_PER_WORKER = max(1, (os.cpu_count() or 1) // EXECUTOR_WORKERS)
+
+
+class ServiceOverloaded(Exception):
+    """Raised when a request arrives while the analysis queue is full."""
+
+
+def _init_worker():
+    # Split the CPU cores between workers instead of letting each one use all of them
+    torch.set_num_threads(TORCH_THREADS_PER_WORKER)
+    preload_models()
+
+
+def _ping():
+    return os.getpid()
+
+
+class AnalysisExecutor:
+    """
+    Runs CPU-bound analysis stages off the event loop.
+
+    In "process" mode each worker process loads its own models once, in
+    the pool initializer. Requests are admitted only while fewer than
+    workers + MAX_QUEUED_REQUESTS are in flight; later ones get
+    ServiceOverloaded right away instead of piling up. The event loop
+    stays free for health checks and I/O the whole time.
+    """
+
+    def __init__(self, mode=EXECUTOR_MODE, workers=EXECUTOR_WORKERS, max_queued=MAX_QUEUED_REQUESTS):
+        self.mode = mode
+        self.workers = workers
+        self.max_queued = max_queued
+        self._pool = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def start(self):
+        if self._pool is not None:
+            return
+        if self.mode == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+            # Start every worker (and load its models) before taking traffic
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self._pool, _ping) for _ in range(self.workers)))
+        else:
+            await asyncio.to_thread(preload_models)
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis")
+
+    async def shutdown(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, True)
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Admission control for one request; raises ServiceOverloaded when the queue is full.
+        """
+        if self.in_flight >= self.workers + self.max_queued:
+            self.rejected += 1
+            raise ServiceOverloaded("Speech analysis queue is full, try again shortly")
+        self.in_flight += 1
+        try:
+            yield
+            self.completed += 1
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, fn, *args):
+        """
+        Runs fn(*args) on a worker and awaits the result.
+        """
+        if self._pool is None:
+            raise RuntimeError("Analysis executor has not been started")
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def metrics(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
@@ -1,24 +1,46 @@
-import os
-import shutil
+import asyncio
 import difflib
-import torch
-import torchaudio
-import librosa
 import numpy as np
-import requests
 import re
-import string
-import joblib
+from contextlib import asynccontextmanager
+from typing import List
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from transformers import WhisperProcessor, WhisperForConditionalGeneration
 from jiwer import wer, cer
-from catboost import CatBoostRegressor
-from .models import ProsodyAwareModel
-from .utils import normalize_text, transcribe_audio, extract_whisper_embeddings, extract_prosody_features, run_gentle_alignment
+from .executor import AnalysisExecutor, ServiceOverloaded
+from .pipeline import analyze_audio, analyze_audio_batch, score_features, score_features_batch
+from .alignment import create_aligner
+from .utils import normalize_text
 from starlette.middleware.cors import CORSMiddleware
 from .db import results_collection  # MongoDB collections
+from .write_behind import WriteBehindWriter
 
-app = FastAPI()
+# Buffered MongoDB writes, flushed in batches by a background task
+db_writer = WriteBehindWriter()
+
+# Worker pool for the CPU-bound stages; it owns the models
+executor = AnalysisExecutor()
+
+# Largest reading session accepted by /{user_id}/analyze_batch
+MAX_BATCH_CLIPS = 16
+
+# Forced alignment backend (local Whisper alignment or the remote Gentle server)
+aligner = create_aligner()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db_writer.start()
+    await aligner.start()
+    # Start the workers and load their models before taking traffic
+    await executor.start()
+    yield
+    await executor.shutdown()
+    await aligner.close()
+    # Flush buffered evaluation logs before the worker exits
+    await db_writer.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # Add CORSMiddleware to handle CORS
@@ -30,124 +52,206 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# -----------------------
-# Load Models
-# -----------------------
-MODEL_PATH = "/host_data/whisper-finetuned-final"
-SCORING_MODEL_PATH = "/host_data/catboost_scoring_model.cbm"
-PROSODY_MODEL_PATH = "/host_data/prosody_contrastive_model.pth"
-SCALER_PATH = "/host_data/minmax_scaler.pkl"
-
-processor = WhisperProcessor.from_pretrained(MODEL_PATH)
-asr_model = WhisperForConditionalGeneration.from_pretrained(MODEL_PATH)
-asr_model.eval()
 
-cat_model = CatBoostRegressor()
-cat_model.load_model(SCORING_MODEL_PATH)
+@app.get("/health")
+def health_check():
+    return {"status": "ok"}
 
-prosody_model = ProsodyAwareModel()
-prosody_model.load_state_dict(torch.load(PROSODY_MODEL_PATH, map_location=torch.device("cpu")))
-prosody_model.eval()
 
-scaler = joblib.load(SCALER_PATH)
+@app.get("/metrics")
+def metrics():
+    return {"executor": executor.metrics(), "pending_writes": db_writer.pending()}
 
 
 @app.post("/{user_id}/analyze")
 async def analyze_speech(user_id: str,file: UploadFile = File(...), reference_text: str = Form(...)):
     try:
-        # Ensure the temp directory exists
-        temp_dir = "temp"
-        os.makedirs(temp_dir, exist_ok=True)
-
-        # Sanitize filename
-        safe_filename = re.sub(r'[^a-zA-Z0-9_.-]', '_', file.filename)
-        temp_audio_path = os.path.join(temp_dir, safe_filename)
-
-        # Save uploaded file
-        with open(temp_audio_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # 1. ASR Transcription using Whisper
-        predicted_text = transcribe_audio(temp_audio_path)
-        normalized_reference = normalize_text(reference_text)
-        normalized_predicted = normalize_text(predicted_text)
-
-        # 2. Compute WER and CER
-        wer_score = wer(normalized_reference, normalized_predicted)
-        cer_score = cer(normalized_reference, normalized_predicted)
-        pronunciation_score = max(0, 1 - (wer_score + cer_score) / 2)
-
-        # 3. Identify mispronounced words
-        ref_words = normalized_reference.split()
-        pred_words = normalized_predicted.split()
-        diff = list(difflib.ndiff(ref_words, pred_words))
-        mispronounced_words = [word[2:] for word in diff if word.startswith('- ')]
-
-        # 4. Compute fluency using Gentle forced alignment
-        alignment = run_gentle_alignment(temp_audio_path, reference_text)
-        if alignment:
-            word_timings = [word["end"] - word["start"] for word in alignment["words"] if "start" in word and "end" in word]
-            speaking_rate = len(alignment["words"]) / (word_timings[-1] if word_timings else 1)
-            avg_pause = np.mean(np.diff(word_timings)) if len(word_timings) > 1 else 0
-            abnormal_phones = wer_score
-        else:
-            speaking_rate, avg_pause, abnormal_phones = 0, 0, 0
-
-        # 5. Extract Whisper embeddings and prosody features
-        whisper_embedding = extract_whisper_embeddings(temp_audio_path)
-        prosody_features = extract_prosody_features(temp_audio_path)
-
-        # 6. Pronunciation scoring with the prosody-aware model
-        with torch.no_grad():
-            whisper_tensor = torch.tensor(whisper_embedding, dtype=torch.float32).unsqueeze(0)
-            prosody_tensor = torch.tensor(prosody_features, dtype=torch.float32).unsqueeze(0)
-            pronunciation_embedding = prosody_model(whisper_tensor, prosody_tensor)
-        pronunciation_embedding = pronunciation_embedding.squeeze().numpy()
-
-        # 7. Score prediction using the CatBoost regression model
-        input_features = np.concatenate(
-            ([pronunciation_score, speaking_rate, avg_pause, abnormal_phones], pronunciation_embedding)
+        async with executor.admit():
+            return await _analyze_speech(user_id, file, reference_text)
+    except ServiceOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+async def _analyze_speech(user_id, file, reference_text):
+    """
+    Runs one speech analysis; CPU-heavy stages go to the executor.
+    """
+    # Sanitize filename (only its extension is used, as a format hint)
+    safe_filename = _safe_filename(file)
+    data = await file.read()
+
+    # 1. ASR transcription, Whisper embedding and prosody features run on a worker.
+    #    Forced alignment (used in step 4) runs on the same worker with the local
+    #    backend, or concurrently as an upload to Gentle with the remote one.
+    if aligner.in_process:
+        analysis = await executor.run(analyze_audio, data, safe_filename, reference_text)
+        alignment = analysis["alignment"]
+        if analysis["align_remotely"]:
+            alignment = await aligner.align(data, safe_filename, reference_text)
+    else:
+        analysis, alignment = await asyncio.gather(
+            executor.run(analyze_audio, data, safe_filename),
+            aligner.align(data, safe_filename, reference_text),
         )
-        input_features = input_features.reshape(1, -1)
-        input_features = scaler.transform(input_features)
-        predicted_score = cat_model.predict(input_features)[0]
-
-        # 8. Final score adjustments
-        if len(normalized_reference.split()) != len(normalized_predicted.split()):
-            final_score = 0.0
-        elif pronunciation_score < 0.5:
-            final_score = predicted_score * pronunciation_score
-        else:
-            final_score = predicted_score
-
-        # Cleanup temporary file
-        os.remove(temp_audio_path)
-
-        # Log evaluation data to MongoDB
-        record = {
-            "user_id": user_id,
-            "ReferenceText": reference_text,
-            "PronunciationScore": pronunciation_score,
-            "SpeakingRate(words/sec)": speaking_rate,
-            "AveragePauseDuration (sec)": avg_pause,
-            "AbnormalPhones(approx)": abnormal_phones,
-            "FinalFluencyScore": final_score,
-            "MispronouncedWords": mispronounced_words
-        }
-        results_collection.insert_one(record)
-
-        return {
-            "Reference Text": reference_text,
-            "Predicted Text": predicted_text,
-            "WER": wer_score,
-            "CER": cer_score,
-            "pronunciationScore": pronunciation_score,
-            "Speaking Rate (words/sec)": speaking_rate,
-            "Average Pause Duration (sec)": avg_pause,
-            "Abnormal Phones (approx)": abnormal_phones,
-            "fluencyScore": final_score,
-            "mispronouncedWords": mispronounced_words
-        }
 
+    # 2.-4. Text and timing metrics
+    metrics = _utterance_metrics(reference_text, analysis["predicted_text"], alignment)
+
+    # 5.-7. Prosody-aware embedding and CatBoost score prediction, on a worker
+    predicted_score = await executor.run(
+        score_features, *_fluency_features(metrics),
+        analysis["whisper_embedding"], analysis["prosody_features"]
+    )
+
+    return await _finish_utterance(user_id, reference_text, analysis["predicted_text"], metrics, predicted_score)
+
+
+@app.post("/{user_id}/analyze_batch")
+async def analyze_speech_batch(user_id: str, files: List[UploadFile] = File(...),
+                               reference_texts: List[str] = Form(...)):
+    """
+    Analyzes the sentences of one reading session together: files[i] is a
+    recording of reference_texts[i]. The clips share one batched Whisper
+    pass and one scoring pass.
+    """
+    if len(files) != len(reference_texts):
+        raise HTTPException(status_code=400, detail="Each file needs exactly one reference text")
+    if len(files) > MAX_BATCH_CLIPS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_CLIPS} clips per batch")
+    try:
+        async with executor.admit():
+            return await _analyze_speech_batch(user_id, files, reference_texts)
+    except ServiceOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+async def _analyze_speech_batch(user_id, files, reference_texts):
+    clips = [(await file.read(), _safe_filename(file)) for file in files]
+
+    # 1. One batched ASR/embedding/prosody stage for every clip, with alignment as in _analyze_speech
+    if aligner.in_process:
+        items = [(data, filename, text) for (data, filename), text in zip(clips, reference_texts)]
+        analyses = await executor.run(analyze_audio_batch, items)
+        alignments = await asyncio.gather(*(
+            aligner.align(data, filename, text) if analysis["align_remotely"] else _done(analysis["alignment"])
+            for (data, filename), text, analysis in zip(clips, reference_texts, analyses)
+        ))
+    else:
+        items = [(data, filename, None) for data, filename in clips]
+        analyses, *alignments = await asyncio.gather(
+            executor.run(analyze_audio_batch, items),
+            *(aligner.align(data, filename, text) for (data, filename), text in zip(clips, reference_texts)),
+        )
+
+    # 2.-4. Text and timing metrics per clip
+    metrics = [
+        _utterance_metrics(text, analysis["predicted_text"], alignment)
+        for text, analysis, alignment in zip(reference_texts, analyses, alignments)
+    ]
+
+    # 5.-7. One scoring pass over the stacked features of every clip
+    predicted_scores = await executor.run(
+        score_features_batch,
+        [_fluency_features(m) for m in metrics],
+        [analysis["whisper_embedding"] for analysis in analyses],
+        [analysis["prosody_features"] for analysis in analyses],
+    )
+
+    results = [
+        await _finish_utterance(user_id, text, analysis["predicted_text"], m, score)
+        for text, analysis, m, score in zip(reference_texts, analyses, metrics, predicted_scores)
+    ]
+    return {
+        "results": results,
+        "sessionFluencyScore": float(np.mean([r["fluencyScore"] for r in results])),
+    }
+
+
+async def _done(value):
+    return value
+
+
+def _safe_filename(file):
+    return re.sub(r'[^a-zA-Z0-9_.-]', '_', file.filename or "audio.wav")
+
+
+def _utterance_metrics(reference_text, predicted_text, alignment):
+    normalized_reference = normalize_text(reference_text)
+    normalized_predicted = normalize_text(predicted_text)
+
+    # 2. Compute WER and CER
+    wer_score = wer(normalized_reference, normalized_predicted)
+    cer_score = cer(normalized_reference, normalized_predicted)
+    pronunciation_score = max(0, 1 - (wer_score + cer_score) / 2)
+
+    # 3. Identify mispronounced words
+    ref_words = normalized_reference.split()
+    pred_words = normalized_predicted.split()
+    diff = list(difflib.ndiff(ref_words, pred_words))
+    mispronounced_words = [word[2:] for word in diff if word.startswith('- ')]
+
+    # 4. Compute fluency using the forced alignment
+    if alignment:
+        word_timings = [word["end"] - word["start"] for word in alignment["words"] if "start" in word and "end" in word]
+        speaking_rate = len(alignment["words"]) / (word_timings[-1] if word_timings and word_timings[-1] > 0 else 1)
+        avg_pause = np.mean(np.diff(word_timings)) if len(word_timings) > 1 else 0
+        abnormal_phones = wer_score
+    else:
+        speaking_rate, avg_pause, abnormal_phones = 0, 0, 0
+
+    return {
+        "wer": wer_score,
+        "cer": cer_score,
+        "pronunciation_score": pronunciation_score,
+        "mispronounced_words": mispronounced_words,
+        "word_count_matches": len(ref_words) == len(pred_words),
+        "speaking_rate": speaking_rate,
+        "avg_pause": avg_pause,
+        "abnormal_phones": abnormal_phones,
+    }
+
+
+def _fluency_features(metrics):
+    return [metrics["pronunciation_score"], metrics["speaking_rate"], metrics["avg_pause"], metrics["abnormal_phones"]]
+
+
+async def _finish_utterance(user_id, reference_text, predicted_text, metrics, predicted_score):
+    pronunciation_score = metrics["pronunciation_score"]
+
+    # 8. Final score adjustments
+    if not metrics["word_count_matches"]:
+        final_score = 0.0
+    elif pronunciation_score < 0.5:
+        final_score = predicted_score * pronunciation_score
+    else:
+        final_score = predicted_score
+
+    # Log evaluation data to MongoDB
+    record = {
+        "user_id": user_id,
+        "ReferenceText": reference_text,
+        "PronunciationScore": pronunciation_score,
+        "SpeakingRate(words/sec)": metrics["speaking_rate"],
+        "AveragePauseDuration (sec)": metrics["avg_pause"],
+        "AbnormalPhones(approx)": metrics["abnormal_phones"],
+        "FinalFluencyScore": final_score,
+        "MispronouncedWords": metrics["mispronounced_words"]
+    }
+    await db_writer.insert_one(results_collection, record)
+
+    return {
+        "Reference Text": reference_text,
+        "Predicted Text": predicted_text,
+        "WER": metrics["wer"],
+        "CER": metrics["cer"],
+        "pronunciationScore": pronunciation_score,
+        "Speaking Rate (words/sec)": metrics["speaking_rate"],
+        "Average Pause Duration (sec)": metrics["avg_pause"],
+        "Abnormal Phones (approx)": metrics["abnormal_phones"],
+        "fluencyScore": final_score,
+        "mispronouncedWords": metrics["mispronounced_words"]
+    }
@@ -0,0 +1,158 @@
+import json
+import logging
+import mmap
+import os
+import threading
+
+import joblib
+import torch
+from catboost import CatBoostRegressor
+from transformers import GenerationConfig, WhisperConfig, WhisperForConditionalGeneration, WhisperProcessor
+
+from .models import ProsodyAwareModel
+
+# -----------------------
+# Model locations
+# -----------------------
+WHISPER_MODEL_PATH = "/host_data/whisper-finetuned-final"
+SCORING_MODEL_PATH = "/host_data/catboost_scoring_model.cbm"
+PROSODY_MODEL_PATH = "/host_data/prosody_contrastive_model.pth"
+SCALER_PATH = "/host_data/minmax_scaler.pkl"
+
+# Map Whisper weights straight from model.safetensors (private, copy-on-write).
+# Pages stay backed by the page cache, so every worker process on the node
+# shares one physical copy of the weights.
+MMAP_WHISPER_WEIGHTS = True
+
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+_models = {}
+_lock = threading.Lock()
+
+
+def _load_once(name, loader):
+    """
+    Returns the model registered under `name`, loading it on first use.
+    """
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                model = loader()
+                _models[name] = model
+    return model
+
+
+def _mmap_safetensors(path):
+    """
+    Builds a state dict whose tensors are views into a copy-on-write mmap of `path`.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    header_size = int.from_bytes(buffer[:8], "little")
+    header = json.loads(buffer[8:8 + header_size])
+    data_start = 8 + header_size
+
+    state_dict = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        if end == start:
+            tensor = torch.empty(info["shape"], dtype=dtype)
+        else:
+            count = (end - start) // torch.empty((), dtype=dtype).element_size()
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + start)
+        state_dict[name] = tensor.reshape(info["shape"])
+    return state_dict
+
+
+def _load_whisper_mmap(path):
+    config = WhisperConfig.from_pretrained(path)
+    with torch.device("meta"):
+        model = WhisperForConditionalGeneration(config)
+
+    model.load_state_dict(_mmap_safetensors(os.path.join(path, "model.safetensors")), strict=False, assign=True)
+    model.tie_weights()
+
+    still_meta = [name for name, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if still_meta:
+        raise ValueError(f"weights missing from model.safetensors: {still_meta[:5]}")
+
+    try:
+        model.generation_config = GenerationConfig.from_pretrained(path)
+    except OSError:
+        pass
+    return model
+
+
+def _load_whisper():
+    processor = WhisperProcessor.from_pretrained(WHISPER_MODEL_PATH)
+
+    model = None
+    if MMAP_WHISPER_WEIGHTS and os.path.exists(os.path.join(WHISPER_MODEL_PATH, "model.safetensors")):
+        try:
+            model = _load_whisper_mmap(WHISPER_MODEL_PATH)
+        except Exception as e:
+            logging.warning(f"Memory-mapped Whisper load failed ({e}); falling back to from_pretrained")
+    if model is None:
+        model = WhisperForConditionalGeneration.from_pretrained(WHISPER_MODEL_PATH)
+
+    model.eval()
+    return processor, model
+
+
+def _load_scoring_model():
+    cat_model = CatBoostRegressor()
+    cat_model.load_model(SCORING_MODEL_PATH)
+    return cat_model
+
+
+def _load_prosody_model():
+    prosody_model = ProsodyAwareModel()
+    prosody_model.load_state_dict(torch.load(PROSODY_MODEL_PATH, map_location=torch.device("cpu")))
+    prosody_model.eval()
+    return prosody_model
+
+
+def get_whisper():
+    """
+    Returns the shared (WhisperProcessor, WhisperForConditionalGeneration) pair.
+    """
+    return _load_once("whisper", _load_whisper)
+
+
+def get_scoring_model():
+    return _load_once("scoring", _load_scoring_model)
+
+
+def get_prosody_model():
+    return _load_once("prosody", _load_prosody_model)
+
+
+def get_scaler():
+    return _load_once("scaler", lambda: joblib.load(SCALER_PATH))
+
+
+def preload_models():
+    """
+    Loads every model up front, e.g. at startup, so the first request does not pay for it.
+    """
+    get_whisper()
+    get_scoring_model()
+    get_prosody_model()
+    get_scaler()
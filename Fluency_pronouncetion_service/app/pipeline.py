@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from .alignment import can_align_locally, whisper_forced_alignment
+from .audio import AudioContext
+from .model_registry import get_prosody_model, get_scaler, get_scoring_model
+from .utils import extract_prosody_features, transcribe_and_embed, transcribe_and_embed_batch
+
+# Threads computing prosody features for the clips of one batch
+PROSODY_THREADS = 4
+
+
+# -----------------------
+# CPU-bound analysis stages. These run in the analysis executor's workers
+# (see executor.py), never on the event loop, so they must stay importable
+# top-level functions with picklable arguments and results.
+# -----------------------
+def analyze_audio(data, filename, reference_text=None):
+    """
+    Decodes an upload and runs the model-heavy stages on it:
+    Whisper transcription + embedding and prosody features. When
+    reference_text is given, it is also force-aligned locally, reusing the
+    encoder pass of the transcription, unless "align_remotely" is set.
+    """
+    audio = AudioContext.from_bytes(data, filename)
+    predicted_text, whisper_embedding = transcribe_and_embed(audio)
+    prosody_features = extract_prosody_features(audio)
+    result = {
+        "predicted_text": predicted_text,
+        "whisper_embedding": whisper_embedding,
+        "prosody_features": prosody_features,
+    }
+    if reference_text is not None:
+        _align(result, audio, reference_text)
+    return result
+
+
+def _align(result, audio, reference_text):
+    # Long clips are left for the caller to align remotely (see WhisperAligner)
+    result["align_remotely"] = not can_align_locally(audio)
+    result["alignment"] = None if result["align_remotely"] else whisper_forced_alignment(audio, reference_text)
+
+
+def analyze_audio_batch(items):
+    """
+    Batched analyze_audio for the clips of one reading session. items is a
+    list of (data, filename, reference_text) tuples, with reference_text
+    None to skip local alignment. All clips share one Whisper encoder pass
+    and one generate() call; prosody features are computed in parallel.
+    """
+    audios = [AudioContext.from_bytes(data, filename) for data, filename, _ in items]
+    with ThreadPoolExecutor(max_workers=min(PROSODY_THREADS, len(audios))) as pool:
+        prosody_futures = [pool.submit(extract_prosody_features, audio) for audio in audios]
+        asr_results = transcribe_and_embed_batch(audios)
+        prosody_results = [future.result() for future in prosody_futures]
+
+    results = []
+    for audio, (_, _, reference_text), (predicted_text, whisper_embedding), prosody_features in zip(
+            audios, items, asr_results, prosody_results):
+        result = {
+            "predicted_text": predicted_text,
+            "whisper_embedding": whisper_embedding,
+            "prosody_features": prosody_features,
+        }
+        if reference_text is not None:
+            _align(result, audio, reference_text)
+        results.append(result)
+    return results
+
+
+def score_features(pronunciation_score, speaking_rate, avg_pause, abnormal_phones,
+                   whisper_embedding, prosody_features):
+    """
+    Predicts the fluency score from the ASR, alignment and prosody features.
+    """
+    return score_features_batch(
+        [[pronunciation_score, speaking_rate, avg_pause, abnormal_phones]],
+        [whisper_embedding], [prosody_features]
+    )[0]
+
+
+def score_features_batch(fluency_features, whisper_embeddings, prosody_features):
+    """
+    Batched score_features: one row per clip in each argument. The prosody
+    model, scaler and CatBoost model each run once on the stacked matrix.
+    """
+    # Pronunciation scoring with the prosody-aware model
+    with torch.no_grad():
+        whisper_tensor = torch.tensor(np.stack(whisper_embeddings), dtype=torch.float32)
+        prosody_tensor = torch.tensor(np.stack(prosody_features), dtype=torch.float32)
+        pronunciation_embeddings = get_prosody_model()(whisper_tensor, prosody_tensor)
+    pronunciation_embeddings = pronunciation_embeddings.reshape(len(whisper_embeddings), -1).numpy()
+
+    # Score prediction using the CatBoost regression model
+    input_features = np.hstack((np.asarray(fluency_features, dtype=np.float64), pronunciation_embeddings))
+    input_features = get_scaler().transform(input_features)
+    return [float(score) for score in get_scoring_model().predict(input_features)]
@@ -0,0 +1,147 @@
+import os
+
+import numpy as np
+import librosa
+import scipy.fft
+from scipy.signal import resample_poly
+
+# -----------------------
+# Prosody feature settings
+# -----------------------
+# The scoring models were fitted on librosa.yin(y, fmin=50, fmax=400) and
+# librosa.feature.rms(y=y) of the 16 kHz waveform. That yin call used
+# librosa's default sr of 22050, so pitch is expressed on a 22050 Hz scale;
+# PITCH_REFERENCE_SR keeps avg_pitch on that scale for the scaler and CatBoost.
+PITCH_REFERENCE_SR = 22050
+PITCH_FMIN = 50
+PITCH_FMAX = 400
+TROUGH_THRESHOLD = 0.1
+
+# The defaults reproduce the fitted features and run at about librosa's
+# speed. A deployment can opt into the faster path with
+# PROSODY_PITCH_ESTIMATOR=fast (1.6-3.4x faster, up to ~3% pitch error,
+# see benchmarks/bench_prosody.py) and/or a larger PROSODY_HOP_LENGTH.
+FRAME_LENGTH = 2048            # samples per analysis frame (yin and rms defaults)
+HOP_LENGTH = int(os.environ.get("PROSODY_HOP_LENGTH", 512))  # larger hops trade time resolution for speed
+# "yin": matches the fitted features; "fast": yin on a 2x-decimated signal
+PITCH_ESTIMATOR = os.environ.get("PROSODY_PITCH_ESTIMATOR", "yin")
+FAST_DECIMATION = 2            # pitch stays far below the decimated Nyquist frequency
+
+if PITCH_ESTIMATOR not in ("yin", "fast"):
+    raise ValueError(f"Unknown pitch estimator: {PITCH_ESTIMATOR}")
+
+
+def frame_waveform(y, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    """
+    Centered, zero-padded frames of y as a strided view of shape
+    (frame_length, num_frames), framed like librosa's center=True default.
+    """
+    y = np.pad(y, frame_length // 2, mode="constant")
+    return librosa.util.frame(y, frame_length=frame_length, hop_length=hop_length)
+
+
+def frame_rms(frames):
+    """
+    Root-mean-square energy per frame, as librosa.feature.rms.
+    """
+    return np.sqrt(np.mean(np.abs(frames) ** 2, axis=0))
+
+
+def frame_autocorrelation(frames, max_lag):
+    """
+    Autocorrelation of every frame for lags 0..max_lag, in one batched FFT.
+    Lag 0 is each frame's energy (sum of squares).
+    """
+    n_fft = scipy.fft.next_fast_len(2 * frames.shape[0] - 1, real=True)
+    spectrum = scipy.fft.rfft(frames, n=n_fft, axis=0)
+    power = np.square(spectrum.real) + np.square(spectrum.imag)
+    return scipy.fft.irfft(power, n=n_fft, axis=0)[:max_lag + 1]
+
+
+def _difference_function(frames, acf, min_period, max_period):
+    # Cumulative mean normalized difference (YIN eq. 8) as in librosa.yin
+    energy = np.cumsum(np.square(frames[:max_period]), axis=0)
+
+    lags = slice(1, max_period + 1)
+    diff = 2 * (acf[0:1] - acf[lags]) - energy
+
+    numerator = diff[min_period - 1:]
+    tau = np.arange(1, max_period + 1)[:, None]
+    cumulative_mean = np.cumsum(diff, axis=0) / tau
+    denominator = cumulative_mean[min_period - 1:]
+    return numerator / (denominator + np.finfo(denominator.dtype).tiny)
+
+
+def yin_periods(frames, min_period, max_period, acf=None, trough_threshold=TROUGH_THRESHOLD):
+    """
+    YIN period estimate (in samples, with parabolic refinement) per frame.
+    Vectorized over frames; matches librosa.yin on the same frames. acf
+    may be passed in when the caller has already computed it.
+    """
+    max_period = min(max_period, frames.shape[0] - 1)
+    if acf is None:
+        acf = frame_autocorrelation(frames, max_period)
+    cmnd = _difference_function(frames, acf, min_period, max_period)
+
+    # First trough under the threshold, else the global minimum
+    prev, cur, nxt = cmnd[:-2], cmnd[1:-1], cmnd[2:]
+    is_trough = np.zeros(cmnd.shape, dtype=bool)
+    is_trough[1:-1] = (cur < prev) & (cur <= nxt)
+    is_trough[0] = cmnd[0] < cmnd[1]
+    is_threshold_trough = is_trough & (cmnd < trough_threshold)
+    period = np.argmax(is_threshold_trough, axis=0)
+    no_trough = ~is_threshold_trough.any(axis=0)
+    period[no_trough] = np.argmin(cmnd, axis=0)[no_trough]
+
+    # Parabolic interpolation around the chosen lag only (no shift at the edges)
+    columns = np.arange(cmnd.shape[1])
+    inner = np.clip(period, 1, len(cmnd) - 2)
+    before, at, after = cmnd[inner - 1, columns], cmnd[inner, columns], cmnd[inner + 1, columns]
+    a = after + before - 2 * at
+    b = (after - before) / 2
+    valid = (np.abs(b) < np.abs(a)) & (period == inner)
+    shift = np.where(valid, -b / np.where(valid, a, 1), 0)
+    return min_period + period + shift
+
+
+def _pitch_range(sr):
+    return int(np.floor(sr / PITCH_FMAX)), int(np.ceil(sr / PITCH_FMIN))
+
+
+def frame_pitch(frames, sr=PITCH_REFERENCE_SR, acf=None):
+    """
+    Per-frame f0 from a framed waveform, on the scale of the given sr.
+    """
+    min_period, max_period = _pitch_range(sr)
+    return sr / yin_periods(frames, min_period, max_period, acf=acf)
+
+
+def fast_pitch(y, decimation=FAST_DECIMATION, hop_length=HOP_LENGTH):
+    """
+    Per-frame f0 from y decimated by `decimation`, with proportionally
+    shorter frames. Each frame covers the same stretch of audio, and the
+    FFTs are `decimation` times smaller.
+    """
+    decimated = resample_poly(y, 1, decimation).astype(np.float32, copy=False)
+    frames = frame_waveform(decimated, FRAME_LENGTH // decimation, max(1, hop_length // decimation))
+    return frame_pitch(frames, sr=PITCH_REFERENCE_SR / decimation)
+
+
+def prosody_features(y, estimator=PITCH_ESTIMATOR, hop_length=HOP_LENGTH):
+    """
+    [avg_pitch, avg_intensity] of a mono waveform. Pitch and energy come
+    from one framed view: with the "yin" estimator, frame energy is read
+    off lag 0 of the autocorrelation that the pitch tracker computes anyway.
+    """
+    frames = frame_waveform(y, hop_length=hop_length)
+    if estimator == "yin":
+        _, max_period = _pitch_range(PITCH_REFERENCE_SR)
+        acf = frame_autocorrelation(frames, min(max_period, FRAME_LENGTH - 1))
+        pitch = frame_pitch(frames, acf=acf)
+        intensity = np.sqrt(np.maximum(acf[0], 0) / FRAME_LENGTH)
+    elif estimator == "fast":
+        pitch = fast_pitch(y, hop_length=hop_length)
+        intensity = frame_rms(frames)
+    else:
+        raise ValueError(f"Unknown pitch estimator: {estimator}")
+    return np.array([np.nanmean(pitch), np.mean(intensity)])
@@ -1,18 +1,28 @@
+import math
 import re
 import string
 import torch
-import torchaudio
-import librosa
-import numpy as np
-import requests
-from transformers import WhisperProcessor, WhisperForConditionalGeneration
+import httpx
+from transformers.modeling_outputs import BaseModelOutput
 import noisereduce as nr  # Noise reduction
 
+from .model_registry import get_whisper
+from .prosody import prosody_features
+
+# Pool the Whisper embedding over encoder frames that cover real audio only.
+# Off by default: the prosody model, scaler and CatBoost were fitted on the
+# mean over all 1500 encoder frames of the 30-second input, whose tail is
+# zero-padded log-mel features (see AudioContext.input_features). Unmasked,
+# a single-window clip reproduces those inputs; enable this only together
+# with models refitted on masked embeddings.
+MASK_EMBEDDING_PADDING = False
+
+# Upper bound on decoded tokens per second of audio. Read-aloud speech stays
+# well under this, and the cap stops decoding runaway text over padding.
+MAX_TOKENS_PER_SECOND = 8
+MIN_NEW_TOKENS_BUDGET = 16
+
 
-MODEL_PATH = "/host_data/whisper-finetuned-final"
-processor = WhisperProcessor.from_pretrained(MODEL_PATH)
-asr_model = WhisperForConditionalGeneration.from_pretrained(MODEL_PATH)
-asr_model.eval()
 # -----------------------
 # Function to normalize text by lowercasing and removing punctuation
 # -----------------------
@@ -24,107 +34,170 @@ def normalize_text(text):
 
 
 # -----------------------
-# Function to extract Whisper embeddings using encoder outputs with padding/truncation
+# Function to run the Whisper encoder once per request
 # -----------------------
-def extract_whisper_embeddings(audio_path):
-    waveform, sr = torchaudio.load(audio_path)
-    waveform = torchaudio.functional.resample(waveform, sr, 16000)
-
-    if waveform.dim() > 1:
-        waveform = waveform.mean(dim=0, keepdim=True)  # Convert to mono if needed
-
-    # # **Apply Noise Reduction**
-    # waveform_np = waveform.squeeze().numpy()
-    # reduced_noise_waveform = nr.reduce_noise(y=waveform_np, sr=16000) 
-
-    # Convert waveform to input features (log-mel spectrogram)
-    inputs = processor(
-        waveform.squeeze().numpy(),
-        sampling_rate=16000,
-        return_tensors="pt",
-        padding=True
-    )
-    input_features = inputs.input_features  # (batch, feature_size, time)
-
-    # Ensure the time dimension is exactly 3000
-    desired_length = 3000
-    current_length = input_features.shape[-1]
-
-    if current_length < desired_length:
-        pad_amount = desired_length - current_length
-        input_features = torch.nn.functional.pad(input_features, (0, pad_amount), mode="constant", value=0)
-    elif current_length > desired_length:
-        input_features = input_features[:, :, :desired_length]
+def encode_audio(audio):
+    """
+    Whisper encoder hidden states for the clip, shape (num_windows, 1500, hidden_size).
+    Computed once and cached on the AudioContext, so transcription and the
+    embedding share a single encoder pass. All 30-second windows of a long
+    clip are encoded together as one batch.
+    """
+    if audio.encoder_hidden_states is None:
+        processor, asr_model = get_whisper()
+        input_features = audio.input_features(processor)  # (num_windows, feature_size, 3000)
+        with torch.no_grad():
+            audio.encoder_hidden_states = asr_model.model.encoder(input_features).last_hidden_state
+    return audio.encoder_hidden_states
+
+
+def encode_audio_batch(audios):
+    """
+    Runs the Whisper encoder once over the windows of several clips and
+    caches each clip's slice on its AudioContext, so the per-clip helpers
+    (transcription, embedding, alignment) reuse it.
+    """
+    pending = [audio for audio in audios if audio.encoder_hidden_states is None]
+    if pending:
+        processor, asr_model = get_whisper()
+        input_features = torch.cat([audio.input_features(processor) for audio in pending])
+        with torch.no_grad():
+            hidden_states = asr_model.model.encoder(input_features).last_hidden_state
+        counts = [len(audio.windows()) for audio in pending]
+        for audio, states in zip(pending, torch.split(hidden_states, counts)):
+            audio.encoder_hidden_states = states
+    return [audio.encoder_hidden_states for audio in audios]
 
-    with torch.no_grad():
-        # Pass through the Whisper encoder to get hidden states
-        encoder_outputs = asr_model.model.encoder(input_features).last_hidden_state  # (batch, seq_len, hidden_size)
-        # Average over time to produce a fixed-length embedding
-        embedding = encoder_outputs.mean(dim=1)
 
-    return embedding.squeeze().numpy()
+# -----------------------
+# Function to extract Whisper embeddings using encoder outputs
+# -----------------------
+def extract_whisper_embeddings(audio):
+    encoder_outputs = encode_audio(audio)  # (num_windows, seq_len, hidden_size)
+
+    # Average over time (and across windows) to produce a fixed-length embedding
+    if MASK_EMBEDDING_PADDING:
+        mask = audio.encoder_frame_mask().unsqueeze(-1).to(encoder_outputs.dtype)
+        embedding = (encoder_outputs * mask).sum(dim=(0, 1)) / mask.sum()
+    else:
+        embedding = encoder_outputs.mean(dim=(0, 1))
+    return embedding.numpy()
 
 
 # -----------------------
 # Function to extract prosody features
 # -----------------------
-def extract_prosody_features(audio_path):
-    y, sr = librosa.load(audio_path, sr=16000)
-    pitch = librosa.yin(y, fmin=50, fmax=400)
-    avg_pitch = np.nanmean(pitch)  # Average pitch (Hz)
-    avg_intensity = np.mean(librosa.feature.rms(y=y))  # Average intensity (energy)
-    return np.array([avg_pitch, avg_intensity])
+def extract_prosody_features(audio):
+    # [average pitch, average intensity (energy)] from one framed pass (see prosody.py)
+    return prosody_features(audio.waveform)
 
 
 # -----------------------
-# Function to run forced alignment using Gentle Docker
+# Async client for forced alignment using Gentle Docker
 # -----------------------
-def run_gentle_alignment(audio_path, transcript):
-    url = "http://20.193.146.113:8765/transcriptions?async=false"
-
-    with open(audio_path, "rb") as audio_file:
-        files = {"audio": audio_file}
-        data = {"transcript": transcript}
-        response = requests.post(url, files=files, data=data)
-
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Error in forced alignment: {response.text}")
-        return None
+GENTLE_URL = "http://20.193.146.113:8765/transcriptions?async=false"
+GENTLE_CONNECT_TIMEOUT = 5.0
+GENTLE_READ_TIMEOUT = 60.0
+GENTLE_MAX_CONNECTIONS = 10
+
+
+class GentleClient:
+    """
+    Pooled async HTTP client for the Gentle alignment server, so the
+    alignment upload can run concurrently with the ASR stage.
+    """
+
+    def __init__(self, url=GENTLE_URL):
+        self.url = url
+        self._client = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(GENTLE_READ_TIMEOUT, connect=GENTLE_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=GENTLE_MAX_CONNECTIONS,
+                                    max_keepalive_connections=GENTLE_MAX_CONNECTIONS),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def align(self, data, filename, transcript):
+        """
+        Returns Gentle's alignment JSON, or None if alignment failed.
+        """
+        files = {"audio": (filename, data)}
+        try:
+            response = await self._client.post(self.url, files=files, data={"transcript": transcript})
+        except httpx.HTTPError as e:
+            print(f"Error in forced alignment: {e!r}")
+            return None
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            print(f"Error in forced alignment: {response.text}")
+            return None
 
 
 # -----------------------
 # Function to transcribe audio using Whisper's generate() method
 # -----------------------
-def transcribe_audio(audio_path):
-    waveform, sr = torchaudio.load(audio_path)
-    waveform = torchaudio.functional.resample(waveform, sr, 16000)
-
-    if waveform.dim() > 1:
-        waveform = waveform.mean(dim=0, keepdim=True)
-
-    # Convert waveform to input features (log-mel spectrogram)
-    inputs = processor(
-        waveform.squeeze().numpy(),
-        sampling_rate=16000,
-        return_tensors="pt",
-        padding=True
-    )
-    input_features = inputs.input_features  # shape: (batch, feature_size, time)
-
-    # Ensure the time dimension is exactly 3000
-    desired_length = 3000
-    current_length = input_features.shape[-1]
-
-    if current_length < desired_length:
-        pad_amount = desired_length - current_length
-        input_features = torch.nn.functional.pad(input_features, (0, pad_amount), mode="constant", value=0)
-    elif current_length > desired_length:
-        input_features = input_features[:, :, :desired_length]
+def transcribe_audio(audio):
+    processor, asr_model = get_whisper()
+
+    # Decode from the cached encoder outputs instead of re-running the encoder
+    encoder_outputs = BaseModelOutput(last_hidden_state=encode_audio(audio))
+
+    # Budget decoder steps by the longest window's duration instead of the
+    # model's full 448-token limit
+    max_target = asr_model.config.max_target_positions - 8  # leave room for the prompt tokens
+    longest = max(audio.window_durations())
+    max_new_tokens = min(max_target, MIN_NEW_TOKENS_BUDGET + math.ceil(longest * MAX_TOKENS_PER_SECOND))
 
     with torch.no_grad():
-        generated_ids = asr_model.generate(input_features)
+        generated_ids = asr_model.generate(encoder_outputs=encoder_outputs, max_new_tokens=max_new_tokens)
+
+    # Stitch the per-window transcripts back together
+    transcripts = processor.batch_decode(generated_ids, skip_special_tokens=True)
+    return " ".join(t.strip() for t in transcripts if t.strip())
+
+
+def transcribe_audio_batch(audios):
+    """
+    Transcribes several clips with one batched encoder pass and one
+    generate() call over all of their windows.
+    """
+    processor, asr_model = get_whisper()
+    encoder_states = encode_audio_batch(audios)
+    encoder_outputs = BaseModelOutput(last_hidden_state=torch.cat(encoder_states))
+
+    max_target = asr_model.config.max_target_positions - 8
+    longest = max(max(audio.window_durations()) for audio in audios)
+    max_new_tokens = min(max_target, MIN_NEW_TOKENS_BUDGET + math.ceil(longest * MAX_TOKENS_PER_SECOND))
+
+    with torch.no_grad():
+        generated_ids = asr_model.generate(encoder_outputs=encoder_outputs, max_new_tokens=max_new_tokens)
+    transcripts = processor.batch_decode(generated_ids, skip_special_tokens=True)
+
+    # Regroup the window transcripts by clip
+    results, start = [], 0
+    for states in encoder_states:
+        windows = transcripts[start:start + len(states)]
+        results.append(" ".join(t.strip() for t in windows if t.strip()))
+        start += len(states)
+    return results
+
+
+# -----------------------
+# Fused ASR step: one encoder pass for both the transcript and the embedding
+# -----------------------
+def transcribe_and_embed(audio):
+    return transcribe_audio(audio), extract_whisper_embeddings(audio)
+
 
-    transcription = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-    return transcription
+def transcribe_and_embed_batch(audios):
+    transcripts = transcribe_audio_batch(audios)
+    return [(text, extract_whisper_embeddings(audio)) for text, audio in zip(transcripts, audios)]
@@ -0,0 +1,91 @@
+"""
+Benchmark: prosody features (app/prosody.py) vs the original
+librosa.yin + librosa.feature.rms implementation.
+
+Uses synthetic read-aloud-like clips: a harmonic voice with a gliding f0,
+syllable-rate amplitude envelope, pauses and background noise. Besides
+timing, it checks that every configuration stays within tolerance of the
+original [avg_pitch, avg_intensity] features the scaler and CatBoost model
+were fitted on, and exits non-zero if one does not.
+
+Run from the Fluency_pronouncetion_service directory:
+    python -m benchmarks.bench_prosody
+"""
+import sys
+import time
+
+import librosa
+import numpy as np
+
+from app.prosody import prosody_features
+
+SAMPLE_RATE = 16000
+
+# (estimator, hop_length, max relative error of avg_pitch, of avg_intensity)
+CONFIGS = [
+    ("yin", 512, 1e-3, 1e-4),     # the default: reproduces the fitted features up to float32 rounding
+    ("fast", 512, 0.03, 1e-4),
+    ("fast", 1024, 0.05, 0.02),
+]
+
+
+def reference_features(y):
+    # The original utils.extract_prosody_features
+    pitch = librosa.yin(y, fmin=50, fmax=400)
+    return np.array([np.nanmean(pitch), np.mean(librosa.feature.rms(y=y))])
+
+
+def make_clip(rng, seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = rng.uniform(100, 220) + 40 * np.sin(2 * np.pi * rng.uniform(0.2, 0.6) * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+
+    # Syllables at ~4 Hz, with a pause every couple of seconds
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    envelope *= (np.sin(2 * np.pi * t / rng.uniform(1.5, 3.0)) > -0.7)
+    y = 0.2 * voice * envelope + 0.005 * rng.standard_normal(len(t))
+    return y.astype(np.float32)
+
+
+def timeit(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    rng = np.random.default_rng(0)
+    failures = 0
+    header = f"{'seconds':>7} {'librosa ms':>11}" + "".join(
+        f" {f'{name}/{hop} ms':>13} {'speedup':>8} {'pitch err':>10} {'energy err':>10}"
+        for name, hop, _, _ in CONFIGS
+    )
+    print(header)
+
+    for seconds in (3, 10, 30):
+        clips = [make_clip(rng, seconds) for _ in range(4)]
+        repeat = 10 if seconds <= 10 else 3
+        references = [reference_features(y) for y in clips]
+        t_reference = timeit(lambda: [reference_features(y) for y in clips], repeat) / len(clips)
+        row = f"{seconds:>7} {t_reference * 1e3:>11.2f}"
+
+        for name, hop, pitch_tol, energy_tol in CONFIGS:
+            outputs = [prosody_features(y, estimator=name, hop_length=hop) for y in clips]
+            errors = np.max([np.abs(out - ref) / np.abs(ref) for out, ref in zip(outputs, references)], axis=0)
+            t = timeit(lambda: [prosody_features(y, estimator=name, hop_length=hop) for y in clips], repeat) / len(clips)
+            ok = errors[0] <= pitch_tol and errors[1] <= energy_tol
+            failures += not ok
+            row += (f" {t * 1e3:>13.2f} {t_reference / t:>7.1f}x {errors[0]:>10.2e} {errors[1]:>10.2e}"
+                    + ("" if ok else " FAIL"))
+        print(row)
+
+    if failures:
+        print(f"{failures} configuration(s) outside tolerance")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
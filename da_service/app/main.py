@@ -1,15 +1,42 @@
-from difflib import SequenceMatcher
+import asyncio
+from contextlib import asynccontextmanager
 
+import numpy as np
 from bson import ObjectId
 from fastapi import FastAPI, HTTPException
 from starlette.middleware.cors import CORSMiddleware
 
-from .models import DifficultyRequest, DifficultyResponse  # Removed PassageResponse
-from .services.qa_service import evaluate_answer
+from .models import (  # Removed PassageResponse
+    BatchDifficultyRequest,
+    BatchDifficultyResponse,
+    BatchDifficultyResult,
+    DifficultyRequest,
+    DifficultyResponse,
+)
+from .services.qa_service import QAClient, evaluate_answer, fetch_gold_answer
+from .services.similarity import (
+    answer_similarity,
+    batch_answer_similarity,
+    batch_similarity_reward,
+    similarity_reward,
+)
 from .services.adjustment_service import load_adjustment_model, predict_adjustment
 from .services.db import results_collection, users_collection  # MongoDB collections
+from .services.write_behind import WriteBehindWriter
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled QA client per worker, shared by all requests
+    await qa_client.start()
+    await db_writer.start()
+    yield
+    # Flush buffered evaluation logs before the worker exits
+    await db_writer.stop()
+    await qa_client.close()
+
 
-app = FastAPI(title="Difficulty Adjustment Microservice")
+app = FastAPI(title="Difficulty Adjustment Microservice", lifespan=lifespan)
 
 # Add CORSMiddleware to handle CORS
 app.add_middleware(
@@ -23,6 +50,12 @@ app.add_middleware(
 # Load the ML adjustment model at startup
 ml_model = load_adjustment_model()
 
+# Async client for the QA microservice, opened and closed in the app lifespan
+qa_client = QAClient()
+
+# Buffered MongoDB writes, flushed in batches by a background task
+db_writer = WriteBehindWriter()
+
 
 @app.get("/")
 def root():
@@ -53,15 +86,15 @@ async def adjust_difficulty(user_id: str, grade: int, payload: DifficultyRequest
 
         if payload.question_type.lower() == "saq":
             # Evaluate using the QA microservice as usual.
-            reward, gold_answer, similarity = evaluate_answer(payload.user_answer, passage_text, question)
+            reward, gold_answer, similarity = await evaluate_answer(qa_client, payload.user_answer, passage_text, question)
         elif payload.question_type.lower() == "jsq":
             # For jumble sentence questions, treat the passage as the correct sentence.
             gold_answer = passage_text
-            similarity = SequenceMatcher(None, payload.user_answer.lower(), gold_answer.lower()).ratio()
-            reward = 1.0 if similarity >= 0.7 else (-1.0 if similarity <= 0.3 else 0.0)
+            similarity = answer_similarity(payload.user_answer, gold_answer)
+            reward = similarity_reward(similarity)
         else:
             # If question_type is not recognized, default to standard evaluation.
-            reward, gold_answer, similarity = evaluate_answer(payload.user_answer, passage_text, question)
+            reward, gold_answer, similarity = await evaluate_answer(qa_client, payload.user_answer, passage_text, question)
 
         # Predict difficulty adjustment using the ML model
         predicted_adjustment = predict_adjustment(ml_model, payload.current_difficulty, similarity, reward)
@@ -82,10 +115,11 @@ async def adjust_difficulty(user_id: str, grade: int, payload: DifficultyRequest
             "grade": grade,
             "question_type": payload.question_type,
         }
-        results_collection.insert_one(record)
+        await db_writer.insert_one(results_collection, record)
 
         # Update the user's difficulty level in MongoDB
-        users_collection.update_one(
+        await db_writer.update_one(
+            users_collection,
             {"_id": ObjectId(user_id)},
             {"$set": {"currentDifficulty": new_difficulty}}
         )
@@ -104,6 +138,109 @@ async def adjust_difficulty(user_id: str, grade: int, payload: DifficultyRequest
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/adjust_difficulty_batch/{grade}", response_model=BatchDifficultyResponse)
+async def adjust_difficulty_batch(grade: int, payload: BatchDifficultyRequest):
+    """
+    Evaluates a whole set of answers (one user's quiz or a whole class) at once.
+
+    - Gold answers for SAQ questions are fetched concurrently, once per
+      distinct (passage, question); JSQ answers use the passage itself.
+    - Similarities and rewards are computed for all answers in one batch.
+    - Difficulty updates are applied in submission order per user: the k-th
+      answers of all users are predicted together, each starting from the
+      difficulty left by that user's previous answer.
+    - Evaluation records and each user's final difficulty are queued on the
+      write-behind writer, in order with /adjust_difficulty's writes.
+    """
+    try:
+        answers = payload.answers
+        missing = {a.user_id for a in answers} - set(payload.current_difficulties)
+        if missing:
+            raise HTTPException(status_code=400,
+                                detail=f"Missing current difficulty for user(s): {', '.join(sorted(missing))}")
+        if not answers:
+            return BatchDifficultyResponse(results=[], updated_difficulties={})
+
+        # 1. Gold answers: one QA call per distinct (passage, question)
+        qa_keys = list({(a.passage, a.question) for a in answers if a.question_type.lower() != "jsq"})
+        qa_answers = await asyncio.gather(
+            *(fetch_gold_answer(qa_client, passage, question) for passage, question in qa_keys)
+        )
+        gold_by_key = dict(zip(qa_keys, qa_answers))
+        gold_answers = [
+            a.passage if a.question_type.lower() == "jsq" else gold_by_key[(a.passage, a.question)]
+            for a in answers
+        ]
+
+        # 2. Similarities and rewards for every answer at once
+        similarities = batch_answer_similarity([a.user_answer for a in answers], gold_answers)
+        rewards = batch_similarity_reward(similarities)
+
+        # 3. Difficulty adjustments, stepping through each user's answers in order
+        difficulties = {user_id: float(d) for user_id, d in payload.current_difficulties.items()}
+        positions = {}
+        for i, a in enumerate(answers):
+            positions.setdefault(a.user_id, []).append(i)
+
+        predicted = np.zeros(len(answers))
+        updated = np.zeros(len(answers))
+        for step in range(max(len(p) for p in positions.values())):
+            indices = [p[step] for p in positions.values() if step < len(p)]
+            rows = [[difficulties[answers[i].user_id], similarities[i], rewards[i]] for i in indices]
+            adjustments = ml_model.predict_many(rows)
+            for i, row, adjustment in zip(indices, rows, adjustments):
+                new_difficulty = max(0, min(120, row[0] + adjustment))
+                difficulties[answers[i].user_id] = new_difficulty
+                predicted[i] = adjustment
+                updated[i] = new_difficulty
+
+        # 4. Log evaluation data and the final difficulty of each user to MongoDB
+        records = [
+            {
+                "user_id": a.user_id,
+                "question": a.question,
+                "user_answer": a.user_answer,
+                "gold_answer": gold_answers[i],
+                "passage": a.passage,
+                "similarity": float(similarities[i]),
+                "predicted_adjustment": float(predicted[i]),
+                "updated_difficulty": float(updated[i]),
+                "grade": grade,
+                "question_type": a.question_type,
+            }
+            for i, a in enumerate(answers)
+        ]
+        user_updates = [
+            ("update", users_collection, {"_id": ObjectId(user_id)}, {"$set": {"currentDifficulty": difficulties[user_id]}})
+            for user_id in positions
+        ]
+        # Through the write-behind queue, after any single-answer writes still pending for these users
+        await db_writer.enqueue_many([("insert", results_collection, record) for record in records] + user_updates)
+
+        results = [
+            BatchDifficultyResult(
+                user_id=a.user_id,
+                question=a.question,
+                gold_answer=gold_answers[i],
+                user_answer=a.user_answer,
+                similarity=float(similarities[i]),
+                reward=float(rewards[i]),
+                predicted_adjustment=float(predicted[i]),
+                updated_difficulty=float(updated[i]),
+            )
+            for i, a in enumerate(answers)
+        ]
+        return BatchDifficultyResponse(
+            results=results,
+            updated_difficulties={user_id: difficulties[user_id] for user_id in positions},
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/update_score/{user_id}/{final_fluency_score}/{current_flesch_score}")
 def update_score(user_id: str,final_fluency_score: str, current_flesch_score: str):
     """
@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic import BaseModel
 
 
@@ -19,4 +21,25 @@ class DifficultyResponse(BaseModel):
     updated_difficulty: float
 
 
+class BatchAnswer(BaseModel):
+    user_id: str
+    user_answer: str
+    passage: str
+    question: str
+    question_type: str
+
+
+class BatchDifficultyRequest(BaseModel):
+    # Starting difficulty for every user that appears in `answers`
+    current_difficulties: Dict[str, int]
+    # Answers in submission order; a user's answers are applied one after another
+    answers: List[BatchAnswer]
+
+
+class BatchDifficultyResult(DifficultyResponse):
+    user_id: str
+
 
+class BatchDifficultyResponse(BaseModel):
+    results: List[BatchDifficultyResult]
+    updated_difficulties: Dict[str, float]
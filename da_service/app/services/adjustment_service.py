@@ -1,20 +1,156 @@
+import logging
+
 import joblib
+import numpy as np
 import pandas as pd
 
 MODEL_PATH = "app/model/adjustment_model_optimized.pkl"
 
+# Input order used by callers of predict / predict_many
+FEATURE_NAMES = ['current_difficulty', 'answer_similarity', 'user_reward']  # Removed "readability"
+
+
+class AdjustmentPredictor:
+    """
+    Fast predictor for the difficulty adjustment model.
+
+    The trained model is a StandardScaler -> PolynomialFeatures -> linear
+    regressor pipeline. At load time its parameters are folded into plain
+    arrays (a single affine map when the polynomial is of degree 1), so a
+    prediction is a few float multiplications instead of DataFrame
+    construction plus sklearn input validation. Models that cannot be
+    compiled fall back to the original sklearn path.
+    """
+
+    def __init__(self, model, feature_names=FEATURE_NAMES):
+        self.model = model
+        self.feature_names = list(feature_names)
+
+        # Check the feature order once instead of on every call
+        model_features = [str(f) for f in getattr(model, "feature_names_in_", self.feature_names)]
+        if sorted(model_features) != sorted(self.feature_names):
+            raise ValueError(f"Model expects features {model_features}, got {self.feature_names}")
+        self._model_features = model_features
+        self._order = [self.feature_names.index(f) for f in model_features]
+
+        self._affine = None  # (weights, bias) over inputs in self.feature_names order
+        self._poly = None    # (mean, scale, powers, coef, intercept) over model column order
+        self._compile()
+
+    @property
+    def compiled(self):
+        return self._affine is not None or self._poly is not None
+
+    def _compile(self):
+        try:
+            steps = [step for _, step in getattr(self.model, "steps", [("model", self.model)])]
+            n_features = len(self.feature_names)
+            mean, scale = np.zeros(n_features), np.ones(n_features)
+            powers = np.eye(n_features, dtype=np.int64)
+
+            *transforms, regressor = steps
+            seen_poly = False
+            for step in transforms:
+                name = type(step).__name__
+                if name == "StandardScaler" and not seen_poly:
+                    if step.with_mean:
+                        mean = np.asarray(step.mean_, dtype=np.float64)
+                    if step.with_std:
+                        scale = np.asarray(step.scale_, dtype=np.float64)
+                elif name == "PolynomialFeatures" and not seen_poly:
+                    powers = np.asarray(step.powers_, dtype=np.int64)
+                    seen_poly = True
+                else:
+                    return
+
+            coef = np.asarray(regressor.coef_, dtype=np.float64).ravel()
+            intercept = float(np.ravel(regressor.intercept_)[0])
+            if coef.shape[0] != powers.shape[0]:
+                return
+        except AttributeError:
+            return
+
+        if powers.sum(axis=1).max() <= 1:
+            # Degree-1 terms only: fold scaler, polynomial and regressor into w . x + b
+            weights = np.zeros(len(self.feature_names))
+            bias = intercept
+            for term, c in zip(powers, coef):
+                if not term.any():
+                    bias += c
+                    continue
+                j = int(np.argmax(term))
+                weights[self._order[j]] += c / scale[j]
+                bias -= c * mean[j] / scale[j]
+            self._affine = ([float(w) for w in weights], float(bias))
+        else:
+            self._poly = (mean, scale, powers, coef, intercept)
+
+        if not self._matches_model():
+            logging.warning("Compiled adjustment model disagrees with sklearn; using sklearn predictions")
+            self._affine = self._poly = None
+
+    def _matches_model(self):
+        probe = np.array([[0, 0.0, -1.0], [60, 0.5, 0.0], [120, 1.0, 1.0], [37, 0.83, 1.0]], dtype=np.float64)
+        expected = self._predict_sklearn(probe)
+        return np.allclose(self.predict_many(probe), expected, rtol=1e-6, atol=1e-9)
+
+    def _predict_sklearn(self, rows):
+        features = pd.DataFrame(np.asarray(rows, dtype=np.float64), columns=self.feature_names)
+        return np.asarray(self.model.predict(features[self._model_features]), dtype=np.float64).ravel()
+
+    def predict(self, current_difficulty, similarity, reward):
+        """
+        Predicts the adjustment for a single answer from plain floats.
+        """
+        if self._affine is not None:
+            (w0, w1, w2), bias = self._affine
+            return w0 * current_difficulty + w1 * similarity + w2 * reward + bias
+        return float(self.predict_many([[current_difficulty, similarity, reward]])[0])
+
+    def predict_many(self, rows):
+        """
+        Predicts adjustments for an (n, 3) array-like of
+        [current_difficulty, answer_similarity, user_reward] rows.
+        """
+        X = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.feature_names))
+        if self._affine is not None:
+            weights, bias = self._affine
+            return X @ np.asarray(weights) + bias
+        if self._poly is not None:
+            mean, scale, powers, coef, intercept = self._poly
+            scaled = (X[:, self._order] - mean) / scale
+            terms = np.prod(scaled[:, None, :] ** powers[None, :, :], axis=2)
+            return terms @ coef + intercept
+        return self._predict_sklearn(X)
+
+    def export_onnx(self, path):
+        """
+        Exports the underlying sklearn model as an ONNX graph (requires skl2onnx).
+        The graph input columns follow the model's own feature order.
+        """
+        try:
+            from skl2onnx import convert_sklearn
+            from skl2onnx.common.data_types import FloatTensorType
+        except ImportError as e:
+            raise RuntimeError("skl2onnx is required to export the adjustment model to ONNX") from e
+
+        onnx_model = convert_sklearn(
+            self.model, initial_types=[("features", FloatTensorType([None, len(self.feature_names)]))]
+        )
+        with open(path, "wb") as f:
+            f.write(onnx_model.SerializeToString())
+        return path
+
+
 def load_adjustment_model():
     """
     Load the trained difficulty adjustment model.
     """
-    return joblib.load(MODEL_PATH)
+    return AdjustmentPredictor(joblib.load(MODEL_PATH))
+
 
 def predict_adjustment(model, current_difficulty, similarity, reward):
     """
     Predicts difficulty adjustment based on features that match training data.
     """
-    features = pd.DataFrame([[current_difficulty, similarity, reward]],
-                            columns=['current_difficulty', 'answer_similarity', 'user_reward'])  # Removed "readability"
-    return model.predict(features)[0]
-
-
+    return model.predict(current_difficulty, similarity, reward)
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+# Gold answer cache settings
+GOLD_CACHE_MAX_ENTRIES = 10000    # (passage, question) pairs kept in memory
+GOLD_CACHE_TTL_SECONDS = 6 * 3600  # gold answers are recomputed after this
+
+
+def passage_key(passage, question):
+    """
+    Builds the cache key for a (passage, question) pair.
+    Passages are hashed so the key stays small regardless of passage length.
+    """
+    digest = hashlib.sha256(passage.encode("utf-8")).hexdigest()
+    return digest, question.strip()
+
+
+class _LeaderCancelled(Exception):
+    """Set on a pending gold answer whose computing request was cancelled."""
+
+
+class GoldAnswerCache:
+    """
+    In-memory LRU cache of gold answers with a per-entry TTL.
+
+    Concurrent lookups for the same key share a single computation, so a
+    whole class answering the same question triggers one QA call.
+    """
+
+    def __init__(self, max_entries=GOLD_CACHE_MAX_ENTRIES, ttl_seconds=GOLD_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, answer)
+        self._pending = {}             # key -> asyncio.Future for in-flight computations
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, answer = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return answer
+
+    def set(self, key, answer):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, passage, question, compute):
+        """
+        Returns the cached gold answer for (passage, question), awaiting
+        `compute()` to produce and store it on a miss.
+        """
+        key = passage_key(passage, question)
+        answer = self.get(key)
+        if answer is not None:
+            self.hits += 1
+            return answer
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            try:
+                return await asyncio.shield(pending)
+            except _LeaderCancelled:
+                # The request computing the answer went away; compute it ourselves
+                return await self.get_or_compute(passage, question, compute)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            answer = await compute()
+        except asyncio.CancelledError:
+            # Only this request was cancelled: waiters retry instead of failing with it
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            self.set(key, answer)
+            future.set_result(answer)
+            return answer
+        finally:
+            self._pending.pop(key, None)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -1,44 +1,168 @@
-import requests
+import asyncio
 import logging
-from difflib import SequenceMatcher
+import threading
+
+import httpx
+
+from .answer_cache import GoldAnswerCache
+from .similarity import answer_similarity, similarity_reward
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 QA_SERVICE_URL = "http://20.193.146.113:8002/qa"
 
-def evaluate_answer(user_answer, context, question):
+# HTTP client settings for the QA microservice
+QA_CONNECT_TIMEOUT = 5.0        # seconds to establish a connection
+QA_READ_TIMEOUT = 30.0          # seconds to wait for the model to answer
+QA_MAX_CONNECTIONS = 20         # size of the keep-alive connection pool
+QA_MAX_CONCURRENCY = 16         # evaluations allowed in flight at once
+QA_MAX_RETRIES = 3              # attempts per evaluation (including the first)
+QA_BACKOFF_BASE = 0.5           # seconds; doubled after every failed attempt
+
+# Optional in-process QA model used when the remote service is slow or down
+LOCAL_QA_FALLBACK = False
+LOCAL_QA_MODEL_DIR = "/host_data/QA_Model"
+LOCAL_QA_FALLBACK_AFTER = 3.0   # seconds to wait for the remote service before falling back
+
+
+class QAClient:
     """
-    Calls the external Question Answering microservice.
-    Logs request and response details for debugging.
+    Async client for the Question Answering microservice.
+
+    Holds one pooled httpx.AsyncClient for the lifetime of the app so that
+    connections are kept alive between evaluations. A semaphore caps the
+    number of concurrent QA calls and transient failures are retried with
+    exponential backoff.
     """
-    try:
+
+    def __init__(self, url=QA_SERVICE_URL, connect_timeout=QA_CONNECT_TIMEOUT,
+                 read_timeout=QA_READ_TIMEOUT, max_connections=QA_MAX_CONNECTIONS,
+                 max_concurrency=QA_MAX_CONCURRENCY, max_retries=QA_MAX_RETRIES,
+                 backoff_base=QA_BACKOFF_BASE):
+        self.url = url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_answer(self, context, question):
+        """
+        Asks the QA microservice for the gold answer to `question` over `context`.
+        """
+        if self._client is None:
+            raise RuntimeError("QA client has not been started")
+
         payload = {"question": question, "context": context}
+        last_error = None
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await self._client.post(self.url, json=payload)
+                # Client errors will not improve on retry
+                if 400 <= response.status_code < 500:
+                    response.raise_for_status()
+                if response.status_code >= 500:
+                    last_error = RuntimeError(f"QA service returned {response.status_code}: {response.text}")
+                else:
+                    return response.json().get("answer", "No answer generated")
+            except httpx.HTTPStatusError as e:
+                raise RuntimeError(f"Error calling QA service: {str(e)} - Response: {e.response.text}")
+            except httpx.TransportError as e:
+                last_error = e
 
-        # Log the API request payload
-        logging.info(f"Sending request to QA API: {payload}")
+            if attempt < self.max_retries:
+                delay = self.backoff_base * (2 ** (attempt - 1))
+                logging.warning(f"QA call failed (attempt {attempt}/{self.max_retries}): {last_error}; "
+                                f"retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
 
-        response = requests.post(QA_SERVICE_URL, json=payload)
-        response.raise_for_status()
+        raise RuntimeError(f"Error calling QA service: {str(last_error)}")
+
+
+class LocalQAModel:
+    """
+    Lazily loaded in-process copy of the QA model served by qa_service.
+    Inference runs in a worker thread so it does not block the event loop.
+    """
 
-        gold_answer = response.json().get("answer", "No answer generated")
+    def __init__(self, model_dir=LOCAL_QA_MODEL_DIR):
+        self.model_dir = model_dir
+        self._pipeline = None
+        self._lock = threading.Lock()
 
-        # Calculate similarity
-        similarity = SequenceMatcher(None, user_answer.lower(), gold_answer.lower()).ratio()
+    def _load(self):
+        with self._lock:
+            if self._pipeline is None:
+                from transformers import pipeline
+
+                self._pipeline = pipeline("question-answering", model=self.model_dir,
+                                          tokenizer=self.model_dir, device=-1)  # Force CPU
+        return self._pipeline
+
+    def _answer(self, context, question):
+        return self._load()({"question": question, "context": context})["answer"]
+
+    async def get_answer(self, context, question):
+        return await asyncio.to_thread(self._answer, context, question)
+
+
+gold_answer_cache = GoldAnswerCache()
+local_qa_model = LocalQAModel() if LOCAL_QA_FALLBACK else None
+
+
+async def fetch_gold_answer(client, context, question):
+    """
+    Returns the gold answer for (context, question).
+
+    Answers are served from the gold answer cache when possible. On a miss
+    the QA microservice is called; if the in-process fallback is enabled and
+    the remote call is slow or fails, the local model answers instead.
+    """
+    async def compute():
+        if local_qa_model is None:
+            return await client.get_answer(context, question)
+        try:
+            return await asyncio.wait_for(client.get_answer(context, question), LOCAL_QA_FALLBACK_AFTER)
+        except (asyncio.TimeoutError, RuntimeError) as e:
+            logging.warning(f"QA service unavailable ({e!r}); answering with local QA model")
+            return await local_qa_model.get_answer(context, question)
+
+    return await gold_answer_cache.get_or_compute(context, question, compute)
+
+
+async def evaluate_answer(client, user_answer, context, question):
+    """
+    Scores the user's answer against the gold answer for the question.
+    Logs request and response details for debugging.
+    """
+    gold_answer = await fetch_gold_answer(client, context, question)
 
-        # Assign reward based on similarity thresholds
-        reward = 1.0 if similarity >= 0.7 else (-1.0 if similarity <= 0.3 else 0.0)
+    # Calculate similarity
+    similarity = answer_similarity(user_answer, gold_answer)
 
-        # Log important information
-        logging.info(f"User Answer: {user_answer}")
-        logging.info(f"Generated Question: {question}")
-        logging.info(f"Context: {context}")  # Log full context
-        logging.info(f"Gold Answer: {gold_answer}")
-        logging.info(f"Similarity Score: {similarity:.2f}")
-        logging.info(f"Assigned Reward: {reward}")
+    # Assign reward based on similarity thresholds
+    reward = similarity_reward(similarity)
 
-        return reward, gold_answer, similarity
+    # Log important information
+    logging.info(f"User Answer: {user_answer}")
+    logging.info(f"Generated Question: {question}")
+    logging.info(f"Context: {context}")  # Log full context
+    logging.info(f"Gold Answer: {gold_answer}")
+    logging.info(f"Similarity Score: {similarity:.2f}")
+    logging.info(f"Assigned Reward: {reward}")
 
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error calling QA service: {str(e)} - Response: {response.text if response else 'No response'}")
-        raise RuntimeError(f"Error calling QA service: {str(e)}")
+    return reward, gold_answer, similarity
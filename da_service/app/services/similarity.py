@@ -0,0 +1,122 @@
+import threading
+from difflib import SequenceMatcher
+
+import numpy as np
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # pragma: no cover - rapidfuzz is listed in requirements.txt
+    fuzz = process = None
+
+# Similarity method used when callers do not ask for one explicitly.
+#   "edit"      - normalized edit-distance (Indel) ratio; 2 * matches / total length
+#   "token_set" - order-insensitive ratio over the sets of words
+#   "embedding" - cosine similarity of sentence embeddings
+#
+# Note this is a deliberate grading change from the old
+# SequenceMatcher(None, a, b).ratio(): difflib's autojunk heuristic treats
+# frequent characters as junk in strings of 200+ characters, so long JSQ
+# passages used to score near 0 (e.g. 0.10 vs 0.89 for a 100-word answer
+# with a few swapped words) and always earned the -1 reward. Short answers
+# score the same as before. Without rapidfuzz, the fallback runs difflib
+# with autojunk=False, which gives the same metric (to within difflib's
+# greedy block matching).
+DEFAULT_METHOD = "edit"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Reward thresholds applied to the similarity score
+REWARD_HIGH = 0.7
+REWARD_LOW = 0.3
+
+_embedding_model = None
+_embedding_lock = threading.Lock()
+
+
+def _get_embedding_model():
+    global _embedding_model
+    with _embedding_lock:
+        if _embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+
+            _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    return _embedding_model
+
+
+def _edit_ratio(a, b):
+    if fuzz is None:
+        return SequenceMatcher(None, a, b, autojunk=False).ratio()
+    return fuzz.ratio(a, b) / 100.0
+
+
+def _token_set_ratio(a, b):
+    if fuzz is None:
+        return SequenceMatcher(None, " ".join(sorted(set(a.split()))), " ".join(sorted(set(b.split()))),
+                               autojunk=False).ratio()
+    return fuzz.token_set_ratio(a, b) / 100.0
+
+
+def _embedding_similarities(answers, golds):
+    model = _get_embedding_model()
+    vectors = model.encode(list(answers) + list(golds), batch_size=64,
+                           convert_to_numpy=True, normalize_embeddings=True)
+    answer_vectors, gold_vectors = vectors[:len(answers)], vectors[len(answers):]
+    return np.clip(np.einsum("ij,ij->i", answer_vectors, gold_vectors), 0.0, 1.0)
+
+
+_PAIR_SCORERS = {
+    "edit": _edit_ratio,
+    "token_set": _token_set_ratio,
+}
+
+
+def answer_similarity(user_answer, gold_answer, method=None):
+    """
+    Similarity in [0, 1] between a user's answer and the gold answer.
+    Both strings are compared case-insensitively.
+    """
+    method = method or DEFAULT_METHOD
+    if method in _PAIR_SCORERS:
+        return float(_PAIR_SCORERS[method](user_answer.lower(), gold_answer.lower()))
+    return float(batch_answer_similarity([user_answer], [gold_answer], method)[0])
+
+
+def batch_answer_similarity(user_answers, gold_answers, method=None):
+    """
+    Pairwise similarities between user_answers[i] and gold_answers[i].
+    Returns a float numpy array with one score per pair.
+    """
+    method = method or DEFAULT_METHOD
+    if len(user_answers) != len(gold_answers):
+        raise ValueError("user_answers and gold_answers must have the same length")
+    if not user_answers:
+        return np.zeros(0, dtype=np.float64)
+
+    answers = [a.lower() for a in user_answers]
+    golds = [g.lower() for g in gold_answers]
+
+    if method == "embedding":
+        return _embedding_similarities(answers, golds).astype(np.float64)
+
+    if method not in _PAIR_SCORERS:
+        raise ValueError(f"Unknown similarity method: {method}")
+
+    # rapidfuzz scores the pairs in C, in parallel across cores
+    if process is not None and hasattr(process, "cpdist"):
+        scorer = fuzz.ratio if method == "edit" else fuzz.token_set_ratio
+        scores = process.cpdist(answers, golds, scorer=scorer, dtype=np.float64, workers=-1)
+        return scores / 100.0
+
+    scorer = _PAIR_SCORERS[method]
+    return np.array([scorer(a, g) for a, g in zip(answers, golds)], dtype=np.float64)
+
+
+def similarity_reward(similarity):
+    """
+    Maps a similarity score to the reward used by the adjustment model.
+    """
+    return 1.0 if similarity >= REWARD_HIGH else (-1.0 if similarity <= REWARD_LOW else 0.0)
+
+
+def batch_similarity_reward(similarities):
+    similarities = np.asarray(similarities, dtype=np.float64)
+    return np.where(similarities >= REWARD_HIGH, 1.0, np.where(similarities <= REWARD_LOW, -1.0, 0.0))
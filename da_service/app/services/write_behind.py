@@ -0,0 +1,119 @@
+import asyncio
+import logging
+
+from pymongo import InsertOne, UpdateOne
+
+# Write-behind buffer settings
+WRITE_BATCH_SIZE = 200        # flush once this many writes are buffered
+WRITE_FLUSH_INTERVAL = 0.5    # seconds a write may wait before the buffer is flushed
+WRITE_QUEUE_SIZE = 5000       # writers block (backpressure) once this many writes are pending
+
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """
+    Buffers MongoDB writes off the request path.
+
+    Requests enqueue inserts and updates and return immediately. A background
+    task drains the queue and flushes it in batches, either when
+    WRITE_BATCH_SIZE writes are buffered or WRITE_FLUSH_INTERVAL has passed.
+    Each batch is one insert_many (inserts only) or one ordered bulk_write
+    per collection. The blocking pymongo calls run in a worker thread.
+    When the queue is full, callers wait, and stop() flushes everything
+    still pending.
+    """
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL,
+                 max_queue=WRITE_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue = None
+        self._task = None
+        self.written = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Flushes every pending write and stops the background task.
+        """
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def insert_one(self, collection, document):
+        await self._queue.put((collection, "insert", (document,)))
+
+    async def update_one(self, collection, query, update, upsert=False):
+        await self._queue.put((collection, "update", (query, update, upsert)))
+
+    async def enqueue_many(self, writes):
+        """
+        Queues several writes in order. Each item is ("insert", collection,
+        document) or ("update", collection, query, update[, upsert]). Going
+        through the same queue as insert_one/update_one keeps every user's
+        writes in one ordered stream, so a batch never races an older write.
+        """
+        for kind, collection, *args in writes:
+            if kind == "insert":
+                await self.insert_one(collection, *args)
+            elif kind == "update":
+                await self.update_one(collection, *args)
+            else:
+                raise ValueError(f"Unknown write kind: {kind}")
+
+    def pending(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        # Group by collection, keeping the original order of writes within each one
+        groups = {}
+        for collection, kind, args in batch:
+            groups.setdefault(collection.full_name, (collection, []))[1].append((kind, args))
+
+        for collection, writes in groups.values():
+            try:
+                if all(kind == "insert" for kind, _ in writes):
+                    documents = [args[0] for _, args in writes]
+                    await asyncio.to_thread(collection.insert_many, documents, ordered=False)
+                else:
+                    requests = [
+                        InsertOne(args[0]) if kind == "insert" else UpdateOne(args[0], args[1], upsert=args[2])
+                        for kind, args in writes
+                    ]
+                    await asyncio.to_thread(collection.bulk_write, requests, ordered=True)
+                self.written += len(writes)
+            except Exception as e:
+                self.failed += len(writes)
+                logging.error(f"Write-behind flush of {len(writes)} write(s) to {collection.full_name} failed: {e}")
@@ -0,0 +1,85 @@
+"""
+Benchmark: answer similarity engine vs difflib.SequenceMatcher.
+
+Simulates JSQ grading, where the user's answer is compared against the whole
+passage, for passages of increasing length. Timings are against difflib with
+autojunk=False, which computes the same metric as the "edit" method (the
+fallback path). The score columns show why the old default
+SequenceMatcher(None, a, b) is not comparable: its autojunk heuristic
+collapses the score of passages of 200+ characters.
+
+Run from the da_service directory:
+    python -m benchmarks.bench_similarity
+"""
+import random
+import time
+from difflib import SequenceMatcher
+
+from app.services.similarity import answer_similarity, batch_answer_similarity
+
+VOCABULARY = (
+    "the a an cat dog boy girl school teacher book river tree sun rain park ball "
+    "runs reads jumps plays writes sings walks quickly slowly happily under over "
+    "near beside through after before because while and but then red green big small"
+).split()
+
+
+def make_passage(rng, n_words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(n_words)).capitalize() + "."
+
+
+def perturb(rng, text):
+    # Swap a few words around, like a partially correct jumbled-sentence answer
+    words = text.split()
+    for _ in range(max(1, len(words) // 10)):
+        i, j = rng.randrange(len(words)), rng.randrange(len(words))
+        words[i], words[j] = words[j], words[i]
+    return " ".join(words)
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+# autojunk=False difflib is quadratic in passage length (over a second per
+# 1000-word pair), so it is timed on a few pairs only
+DIFFLIB_PAIRS = 8
+
+
+def main():
+    rng = random.Random(0)
+    batch_size = 64
+    print(f"{'words':>6} {'difflib ms':>11} {'edit ms':>9} {'speedup':>8} "
+          f"{'batch/pair ms':>14} {'batch speedup':>14} {'old score':>10} {'edit score':>11}")
+
+    for n_words in (20, 100, 300, 1000):
+        golds = [make_passage(rng, n_words) for _ in range(batch_size)]
+        answers = [perturb(rng, g) for g in golds]
+        repeat = 20 if n_words <= 300 else 3
+        difflib_repeat = 20 if n_words <= 100 else 1
+
+        def run_difflib():
+            for a, g in zip(answers[:DIFFLIB_PAIRS], golds[:DIFFLIB_PAIRS]):
+                SequenceMatcher(None, a.lower(), g.lower(), autojunk=False).ratio()
+
+        def run_single():
+            for a, g in zip(answers, golds):
+                answer_similarity(a, g)
+
+        def run_batch():
+            batch_answer_similarity(answers, golds)
+
+        t_difflib = timeit(run_difflib, difflib_repeat) / DIFFLIB_PAIRS
+        t_single = timeit(run_single, repeat) / batch_size
+        t_batch = timeit(run_batch, repeat) / batch_size
+        old_score = sum(SequenceMatcher(None, a.lower(), g.lower()).ratio() for a, g in zip(answers, golds)) / batch_size
+        edit_score = batch_answer_similarity(answers, golds).mean()
+        print(f"{n_words:>6} {t_difflib * 1e3:>11.3f} {t_single * 1e3:>9.3f} {t_difflib / t_single:>7.1f}x "
+              f"{t_batch * 1e3:>14.3f} {t_difflib / t_batch:>13.1f}x {old_score:>10.2f} {edit_score:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
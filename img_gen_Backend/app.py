@@ -1,37 +1,36 @@
 # Your existing imports...
+from functools import wraps
 from flask import Flask, request, jsonify
-import random
-import pandas as pd
-from transformers import T5ForConditionalGeneration, T5Tokenizer
-from image_generator import ImageGenerator
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from image_jobs import JobQueueFull
+import model_registry
+from model_registry import (get_grammar_corrector, get_image_cache, get_image_generator, get_image_jobs,
+                            get_image_pool, get_prompts, get_similarity_index)
 import torch
 from PIL import Image
 import base64
 from io import BytesIO
 from flask_cors import CORS
-from utils.feedback import generate_feedback, correct_grammar
+from utils.feedback import generate_feedback, correct_grammar, check_cache
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for cross-origin requests
 
-# Initialize image generator and grammar models
-from authtoken import auth_token
-image_gen = ImageGenerator(auth_token)
-
-try:
-    grammar_tokenizer = T5Tokenizer.from_pretrained("models/grammar_model")
-    grammar_model = T5ForConditionalGeneration.from_pretrained("models/grammar_model")
-except Exception as e:
-    print(f"Error loading grammar model: {str(e)}")
-    raise
-
-# Load prompts
-csv_path = "Dataset_Image_gen.csv" # Correct for Docker
-#csv_path = "D:\\SLIIT\\Year 04\\Research\\Datasets\\Dataset_Image_gen.csv"
-df = pd.read_csv(csv_path)
-prompts = df.iloc[:, 0].tolist()  # Assuming the prompts are in the first column
+# Models, the prompt CSV and the services built on them (image pool and cache,
+# job manager, batched grammar corrector, similarity index) come from the
+# model registry, limited to this process's SERVICE_ROLES. Under gunicorn
+# (see gunicorn.conf.py) weights are loaded once in the master and shared by
+# the forked workers; each worker then starts its own services.
+
+def requires_role(role):
+    """Answers 404 for endpoints whose role this process does not serve."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not model_registry.serves(role):
+                return jsonify({"error": f"This server does not serve the '{role}' role!"}), 404
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
 
 # Helper function to convert PIL image to base64
 def pil_to_base64(pil_image):
@@ -39,19 +38,91 @@ def pil_to_base64(pil_image):
     pil_image.save(buffer, format="PNG")
     return base64.b64encode(buffer.getvalue()).decode('utf-8')
 
-# API to generate an image from a random prompt
+# API to generate an image from a random prompt.
+# With {"seed": n} (and optionally one of the dataset prompts as "prompt"),
+# generation is deterministic and served from the image cache when possible.
 @app.route('/generate-image', methods=['POST'])
+@requires_role("image")
 def generate_image():
+    data = request.get_json(silent=True) or {}
+    seed = data.get('seed')
+    if seed is not None:
+        prompt, error = _seeded_prompt(data)
+        if error:
+            return jsonify({"error": error}), 400
+        try:
+            image_base64, cached = get_image_cache().get_or_generate(get_image_generator(), prompt, seed)
+            return jsonify({"image": image_base64, "prompt": prompt, "seed": seed, "cached": cached}), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
     try:
-        prompt = random.choice(prompts)
-        generated_image = image_gen.generate(prompt)
-        image_base64 = pil_to_base64(generated_image)
+        pooled = get_image_pool().take()
+        if pooled is None:
+            return jsonify({"error": "No image is ready yet, try again shortly"}), 503
+        png_bytes, prompt = pooled
+        image_base64 = base64.b64encode(png_bytes).decode('utf-8')
         return jsonify({"image": image_base64, "prompt": prompt}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _seeded_prompt(data):
+    """Validates a {"seed": n, "prompt": ...} request; returns (prompt, error)."""
+    seed = data.get('seed')
+    if not isinstance(seed, int) or isinstance(seed, bool) or seed < 0:
+        return None, "Seed must be a non-negative integer!"
+    prompts = get_prompts()
+    prompt = data.get('prompt') or prompts[seed % len(prompts)]
+    if prompt not in prompts:
+        return None, "Prompt must be one of the dataset prompts!"
+    return prompt, None
+
+# Job API: submit a generation and poll it instead of holding the request open.
+# Body as for /generate-image; without a seed, a random prompt and seed are used.
+@app.route('/jobs', methods=['POST'])
+@requires_role("image")
+def submit_job():
+    data = request.get_json(silent=True) or {}
+    prompt, seed = None, data.get('seed')
+    if seed is not None:
+        prompt, error = _seeded_prompt(data)
+        if error:
+            return jsonify({"error": error}), 400
+    try:
+        job = get_image_jobs().submit(prompt=prompt, seed=seed)
+        return jsonify(job.to_dict()), 202
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@requires_role("image")
+def job_status(job_id):
+    job = get_image_jobs().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found!"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+@requires_role("image")
+def cancel_job(job_id):
+    job = get_image_jobs().cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found!"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+@requires_role("image")
+def job_result(job_id):
+    job = get_image_jobs().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found!"}), 404
+    if job.status != "done":
+        return jsonify(job.to_dict()), 409
+    return jsonify({"image": job.image_base64, "prompt": job.prompt, "seed": job.seed}), 200
+
 # API to check grammar
 @app.route('/check-grammar', methods=['POST'])
+@requires_role("grammar")
 def check_grammar():
     data = request.json
     text = data.get('text', '')
@@ -60,13 +131,14 @@ def check_grammar():
         return jsonify({"error": "Text is required!"}), 400
     
     try:
-        feedback, corrected = generate_feedback(text, grammar_tokenizer, grammar_model)
+        feedback, corrected = generate_feedback(text, get_grammar_corrector())
         return jsonify({"feedback": feedback, "corrected_text": corrected}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # API to check similarity
 @app.route('/check-similarity', methods=['POST'])
+@requires_role("grammar")
 def check_similarity():
     data = request.json
     text = data.get('text', '')
@@ -76,9 +148,7 @@ def check_similarity():
         return jsonify({"error": "Text and prompt are required!"}), 400
 
     try:
-        vectorizer = TfidfVectorizer(stop_words='english')
-        vectors = vectorizer.fit_transform([prompt, text])
-        similarity_score = cosine_similarity(vectors[0], vectors[1])[0][0]
+        similarity_score = get_similarity_index().score(prompt, text)
 
         if similarity_score > 0.8:
             similarity_feedback = "Great match! Your description closely matches the image."
@@ -114,11 +184,37 @@ def final_score():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# Health check API to verify server is running
+# Health check API to verify server is running; reports only what this process has loaded
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "Server is running!"}), 200
+    stats = {"status": "Server is running!", "roles": list(model_registry.SERVICE_ROLES)}
+    for name in ("image_pool", "image_cache", "image_jobs"):
+        component = model_registry.loaded(name)
+        if component is not None:
+            stats[name] = component.stats()
+    grammar_corrector = model_registry.loaded("grammar_corrector")
+    if grammar_corrector is not None:
+        stats["grammar_cache"] = grammar_corrector.cache.stats()
+        stats["languagetool_cache"] = check_cache.stats()
+    return jsonify(stats), 200
+
+# Liveness: the process is up and answering, whether or not models are loaded
+@app.route('/live', methods=['GET'])
+def liveness_check():
+    return jsonify({"status": "alive"}), 200
+
+# Readiness: every model and service for this process's roles is loaded and
+# warmed up; load balancers should only route here once this returns 200
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    ready, components = model_registry.readiness()
+    body = {"ready": ready, "roles": list(model_registry.SERVICE_ROLES), "components": components}
+    return jsonify(body), 200 if ready else 503
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=6000, debug=True)
+    # Development server: load everything up front. For production use
+    # gunicorn -c gunicorn.conf.py app:app
+    model_registry.start_services()
+    # The reloader would import this module twice and start a second refill thread
+    app.run(host='0.0.0.0', port=6000, debug=True, use_reloader=False)
@@ -0,0 +1,51 @@
+"""
+Benchmark: seconds per image for each ImageGenerator inference profile.
+
+Loads the pipeline once per profile, generates one warm-up image, then
+times seeded generations of prompts from Dataset_Image_gen.csv.
+
+Run from the img_gen_Backend directory:
+    python -m benchmarks.bench_diffusion
+    python -m benchmarks.bench_diffusion --profiles cpu-fast cpu-preview --images 5
+"""
+import argparse
+import time
+
+import pandas as pd
+import torch
+
+from authtoken import auth_token
+from image_generator import MODEL_ID, PROFILES, ImageGenerator
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    default_profiles = [name for name in PROFILES if torch.cuda.is_available() or name.startswith("cpu")]
+    parser.add_argument("--profiles", nargs="+", default=default_profiles, choices=list(PROFILES))
+    parser.add_argument("--images", type=int, default=3)
+    parser.add_argument("--model", default=MODEL_ID)
+    args = parser.parse_args()
+
+    prompts = pd.read_csv("Dataset_Image_gen.csv").iloc[:, 0].tolist()
+    print(f"torch threads: {torch.get_num_threads()}")
+    print(f"{'profile':>12} {'dtype':>15} {'steps':>6} {'size':>5} {'load s':>7} {'s/image':>8}")
+
+    for name in args.profiles:
+        profile = PROFILES[name]
+        start = time.perf_counter()
+        generator = ImageGenerator(auth_token, profile=name, model_id=args.model)
+        load_seconds = time.perf_counter() - start
+
+        generator.generate(prompts[0], seed=0)  # warm-up
+        start = time.perf_counter()
+        for i in range(args.images):
+            generator.generate(prompts[(i + 1) % len(prompts)], seed=i)
+        per_image = (time.perf_counter() - start) / args.images
+
+        print(f"{name:>12} {str(profile['dtype']):>15} {profile['steps']:>6} {profile['size']:>5} "
+              f"{load_seconds:>7.1f} {per_image:>8.2f}")
+        del generator
+
+
+if __name__ == "__main__":
+    main()
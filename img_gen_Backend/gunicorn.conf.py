@@ -0,0 +1,65 @@
+# Production server for the image generation / grammar backend:
+#
+#   SERVICE_ROLES=grammar WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py app:app
+#   SERVICE_ROLES=image gunicorn -c gunicorn.conf.py -b 0.0.0.0:6001 app:app
+#
+# The app is imported once in the master (preload_app), which loads the
+# weights for SERVICE_ROLES before forking; workers share those pages
+# copy-on-write. Each worker then starts its own threads (grammar batcher,
+# image pool refill, job workers) and LanguageTool in the background, and
+# reports 200 on /ready once they are up.
+import os
+import sys
+
+# gunicorn reads this file before putting the app directory on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import model_registry
+
+bind = os.environ.get("BIND", "0.0.0.0:6000")
+preload_app = True
+
+# The diffusion pipeline runs one image at a time and the image pool keeps
+# a single index on disk, so processes serving "image" run one worker.
+# Grammar-only deployments scale out across processes.
+if model_registry.serves("image"):
+    workers = 1
+else:
+    workers = int(os.environ.get("WEB_CONCURRENCY", min(4, os.cpu_count() or 1)))
+
+# Threads let concurrent requests in one worker join the same grammar batch
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Image generation on CPU can take minutes; job polling keeps requests short
+# but /generate-image with a seed still blocks on diffusion
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 600))
+graceful_timeout = 30
+keepalive = 5
+
+# Split the cores between workers instead of every worker using all of them
+TORCH_THREADS = max(1, (os.cpu_count() or 1) // workers)
+
+
+def on_starting(server):
+    # Weights only: no threads and no inference before fork
+    model_registry.preload_weights()
+
+
+def post_fork(server, worker):
+    import torch
+
+    torch.set_num_threads(TORCH_THREADS)
+
+
+def post_worker_init(worker):
+    model_registry.start_services_in_background()
+
+
+def worker_exit(server, worker):
+    image_jobs = model_registry.loaded("image_jobs")
+    if image_jobs is not None:
+        image_jobs.shutdown()
+    image_pool = model_registry.loaded("image_pool")
+    if image_pool is not None:
+        image_pool.stop()
@@ -0,0 +1,123 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+# Cache settings
+CACHE_DIR = "image_cache"
+CACHE_MAX_BYTES = 512 * 1024 * 1024   # evict least recently used images beyond this
+
+
+def cache_key(prompt, seed, settings):
+    """
+    Content address of one generated image: a hash of everything that
+    determines it (prompt, seed, and the generator's model/steps/guidance).
+    """
+    payload = json.dumps({"prompt": prompt, "seed": seed, **settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """
+    Size-bounded LRU cache of generated images on local disk.
+
+    Each entry is stored already base64-encoded (<key>.b64), so a hit is
+    returned as-is with no diffusion and no PNG/base64 encoding. Recency
+    is kept in the files' modification times, so the LRU order survives
+    restarts.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = OrderedDict()   # key -> size in bytes, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        files = [name for name in os.listdir(directory) if name.endswith(".b64")]
+        files.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+        for name in files:
+            self._entries[name[:-4]] = os.path.getsize(os.path.join(directory, name))
+        self.total_bytes = sum(self._entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.b64")
+
+    def get(self, key):
+        """Returns the cached base64 PNG for key, or None."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            with open(self._path(key)) as f:
+                image_base64 = f.read()
+            os.utime(self._path(key))
+            return image_base64
+        except FileNotFoundError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, key, image):
+        """Encodes a PIL image once and stores it; returns the base64 PNG."""
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+        image_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(image_base64)
+        os.replace(tmp_path, self._path(key))
+
+        with self._lock:
+            self.total_bytes += len(image_base64) - self._entries.pop(key, 0)
+            self._entries[key] = len(image_base64)
+            self._evict()
+        return image_base64
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get_or_generate(self, generator, prompt, seed, callback=None):
+        """
+        Returns (base64 PNG, cache hit) for a seeded generation, running
+        diffusion only on a miss. Concurrent misses for the same key
+        generate the image once. callback is passed on to the generator.
+        """
+        key = cache_key(prompt, seed, generator.settings())
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                image_base64 = self.get(key)
+                if image_base64 is not None:
+                    return image_base64, True
+                return self.put(key, generator.generate(prompt, seed=seed, callback=callback)), False
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -1,24 +1,106 @@
-from diffusers import StableDiffusionPipeline
+import threading
+
+from diffusers import DPMSolverMultistepScheduler, StableDiffusionPipeline
 import torch
 from PIL import Image, ImageEnhance
 
+MODEL_ID = "CompVis/stable-diffusion-v1-4"
+GUIDANCE_SCALE = 1
+
+# Inference profiles. "gpu-fp16" is the original setup; the CPU profiles use
+# full- or bfloat16-precision weights (fp16 matmuls are slow or unsupported
+# on CPU), DPM-Solver++ so far fewer steps are needed, attention slicing to
+# bound peak memory and channels-last convolutions. The "fast" and
+# "preview" presets also trade resolution for latency.
+PROFILES = {
+    "gpu-fp16": {"dtype": torch.float16, "variant": "fp16", "scheduler": "default", "steps": 50,
+                 "size": 512, "attention_slicing": False, "channels_last": False},
+    "cpu-fp32": {"dtype": torch.float32, "variant": None, "scheduler": "dpm", "steps": 20,
+                 "size": 512, "attention_slicing": True, "channels_last": True},
+    "cpu-bf16": {"dtype": torch.bfloat16, "variant": None, "scheduler": "dpm", "steps": 20,
+                 "size": 512, "attention_slicing": True, "channels_last": True},
+    "cpu-fast": {"dtype": torch.float32, "variant": None, "scheduler": "dpm", "steps": 12,
+                 "size": 384, "attention_slicing": True, "channels_last": True},
+    "cpu-preview": {"dtype": torch.float32, "variant": None, "scheduler": "dpm", "steps": 8,
+                    "size": 256, "attention_slicing": True, "channels_last": True},
+}
+# "auto" picks gpu-fp16 when CUDA is available and cpu-fp32 otherwise
+INFERENCE_PROFILE = "auto"
+
+# The pipeline is not safe to call from several threads at once
+_pipe_lock = threading.Lock()
+
+
+def resolve_profile(profile=INFERENCE_PROFILE):
+    if profile == "auto":
+        profile = "gpu-fp16" if torch.cuda.is_available() else "cpu-fp32"
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown inference profile: {profile}")
+    return profile
+
+
 class ImageGenerator:
-    def _init_(self, auth_token):
+    def __init__(self, auth_token, profile=INFERENCE_PROFILE, model_id=MODEL_ID):
+        self.profile_name = resolve_profile(profile)
+        self.profile = PROFILES[self.profile_name]
+        self.model_id = model_id
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
         self.pipe = StableDiffusionPipeline.from_pretrained(
-            "CompVis/stable-diffusion-v1-4",
-            variant="fp16",
-            torch_dtype=torch.float16,
-            use_auth_token=auth_token,
+            model_id,
+            variant=self.profile["variant"],
+            torch_dtype=self.profile["dtype"],
+            token=auth_token,
             cache_dir="models/diffusion_cache"
-        ).to("cuda" if torch.cuda.is_available() else "cpu")
-        
-    def generate(self, prompt):
-        with torch.autocast("cuda" if torch.cuda.is_available() else "cpu"):
+        ).to(self.device)
+
+        if self.profile["scheduler"] == "dpm":
+            self.pipe.scheduler = DPMSolverMultistepScheduler.from_config(self.pipe.scheduler.config)
+        if self.profile["attention_slicing"]:
+            self.pipe.enable_attention_slicing()
+        if self.profile["channels_last"]:
+            self.pipe.unet.to(memory_format=torch.channels_last)
+            self.pipe.vae.to(memory_format=torch.channels_last)
+        self.pipe.set_progress_bar_config(disable=True)
+
+    def settings(self):
+        """Everything besides prompt and seed that determines the output image."""
+        return {
+            "model": self.model_id,
+            "profile": self.profile_name,
+            "steps": self.profile["steps"],
+            "size": self.profile["size"],
+            "guidance": GUIDANCE_SCALE,
+        }
+
+    def generate(self, prompt, seed=None, callback=None):
+        # With a seed, the same prompt and settings always produce the same image
+        generator = torch.Generator("cpu").manual_seed(seed) if seed is not None else None
+
+        # callback(step, total_steps) runs after every denoising step; an
+        # exception raised from it aborts the run
+        step_end = None
+        if callback is not None:
+            def step_end(pipe, step, timestep, callback_kwargs):
+                callback(step + 1, self.profile["steps"])
+                return callback_kwargs
+
+        # Autocast only on CUDA: on CPU the weights already have the profile's dtype
+        autocast = torch.autocast("cuda") if self.device == "cuda" else torch.inference_mode()
+        with _pipe_lock, autocast:
             # Generate the image
-            generated_image = self.pipe(prompt, guidance_scale=1).images[0]
-            
+            generated_image = self.pipe(
+                prompt,
+                guidance_scale=GUIDANCE_SCALE,
+                num_inference_steps=self.profile["steps"],
+                height=self.profile["size"],
+                width=self.profile["size"],
+                generator=generator,
+                callback_on_step_end=step_end
+            ).images[0]
+
             # Enhance sharpness
             enhancer = ImageEnhance.Sharpness(generated_image)
             enhanced_image = enhancer.enhance(0.5)  # Increase sharpness
-            
+
             return enhanced_image
@@ -0,0 +1,163 @@
+import base64
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+# Job settings
+JOB_WORKERS = 1          # generations run one at a time anyway (the pipeline is locked)
+MAX_PENDING_JOBS = 32    # queued + running jobs; more submissions are rejected
+JOB_TTL = 600            # seconds a finished job (and its image) is kept for polling
+
+
+class JobCancelled(Exception):
+    """Raised from the step callback to abort a cancelled generation."""
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running."""
+
+
+class ImageJob:
+    def __init__(self, prompt, seed, explicit_seed):
+        self.id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.seed = seed
+        self.explicit_seed = explicit_seed
+        self.status = "queued"        # queued -> running -> done | failed | cancelled
+        self.step = 0
+        self.total_steps = None
+        self.image_base64 = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.cancel_requested = threading.Event()
+        self.future = None
+
+    @property
+    def is_finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def to_dict(self):
+        progress = self.step / self.total_steps if self.total_steps else 0.0
+        if self.status == "done":
+            progress = 1.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "prompt": self.prompt,
+            "seed": self.seed,
+            "step": self.step,
+            "total_steps": self.total_steps,
+            "progress": round(progress, 3),
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs image generations as background jobs on a local worker pool.
+
+    submit() returns immediately with a job; progress is updated from the
+    pipeline's per-step callback, and cancel() makes that callback raise,
+    which stops the denoising loop at the next step. Jobs with an explicit
+    seed go through the image cache. Finished jobs are kept for JOB_TTL
+    seconds so clients can fetch the result.
+    """
+
+    def __init__(self, generator, prompts, cache=None, workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS):
+        self.generator = generator
+        self.prompts = prompts
+        self.cache = cache
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, prompt=None, seed=None):
+        explicit_seed = seed is not None
+        job = ImageJob(
+            prompt or random.choice(self.prompts),
+            seed if explicit_seed else random.randrange(2 ** 31),
+            explicit_seed,
+        )
+        with self._lock:
+            self._prune()
+            pending = sum(1 for j in self._jobs.values() if not j.is_finished)
+            if pending >= self.max_pending:
+                raise JobQueueFull("Too many image jobs in progress, try again later")
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job; returns the job, or None if unknown."""
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return job
+        job.cancel_requested.set()
+        if job.future.cancel():  # never started
+            self._finish(job, "cancelled")
+        return job
+
+    def _run(self, job):
+        if job.cancel_requested.is_set():
+            self._finish(job, "cancelled")
+            return
+        job.status = "running"
+
+        def on_step(step, total_steps):
+            job.step, job.total_steps = step, total_steps
+            if job.cancel_requested.is_set():
+                raise JobCancelled()
+
+        try:
+            if self.cache is not None and job.explicit_seed:
+                job.image_base64, _ = self.cache.get_or_generate(self.generator, job.prompt, job.seed, callback=on_step)
+            else:
+                image = self.generator.generate(job.prompt, seed=job.seed, callback=on_step)
+                job.image_base64 = _to_base64(image)
+            self._finish(job, "done")
+        except JobCancelled:
+            self._finish(job, "cancelled")
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, "failed")
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+
+    def _prune(self):
+        # Drop finished jobs older than JOB_TTL (called with the lock held)
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.is_finished and now - job.finished > JOB_TTL]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel_requested.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _to_base64(image):
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
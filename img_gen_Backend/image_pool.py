@@ -0,0 +1,142 @@
+import base64
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+# Pool settings
+POOL_DIR = "image_pool"        # PNGs and index.json live here, so the pool survives restarts
+POOL_SIZE = 8                  # ready images kept on hand
+WAIT_TIMEOUT = 120             # seconds a request waits for an image when the pool is empty
+RETRY_DELAY = 10               # seconds before retrying after a failed generation
+SEEDS_PER_PROMPT = 8           # with an image cache, refills draw from this many seeded variants per prompt
+
+
+class ImagePool:
+    """
+    A bounded pool of pre-generated images, each stored with its prompt.
+
+    A background thread keeps the pool topped up, so requests normally take
+    a ready image instead of running the diffusion pipeline. Images are
+    stored as PNG files in POOL_DIR with an
+    index.json listing them in order, and are reloaded on startup.
+
+    With an ImageCache, refills use seeded generation through the cache,
+    so once a (prompt, seed) variant has been rendered it is never diffused
+    again.
+    """
+
+    def __init__(self, generator, prompts, directory=POOL_DIR, size=POOL_SIZE, cache=None):
+        self.generator = generator
+        self.prompts = prompts
+        self.cache = cache
+        self.directory = directory
+        self.size = size
+        self.index_path = os.path.join(directory, "index.json")
+        self._entries = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self.generated = 0
+        self.served = 0
+        self.failures = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entries = []
+
+        # Keep entries whose image is still on disk, and remove stray PNGs
+        self._entries = [e for e in entries if os.path.exists(os.path.join(self.directory, e["file"]))]
+        indexed = {e["file"] for e in self._entries}
+        for name in os.listdir(self.directory):
+            if name.endswith(".png") and name not in indexed:
+                os.remove(os.path.join(self.directory, name))
+        self._save_index()
+
+    def _save_index(self):
+        # Write to a temporary file first so a crash never leaves a half-written index
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.index_path)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refill_loop, name="image-pool-refill", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _refill_loop(self):
+        while True:
+            with self._cond:
+                while len(self._entries) >= self.size and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+
+            prompt = random.choice(self.prompts)
+            try:
+                name = f"{uuid.uuid4().hex}.png"
+                tmp_path = os.path.join(self.directory, name + ".tmp")
+                if self.cache is not None:
+                    seed = random.randrange(SEEDS_PER_PROMPT)
+                    image_base64, _ = self.cache.get_or_generate(self.generator, prompt, seed)
+                    with open(tmp_path, "wb") as f:
+                        f.write(base64.b64decode(image_base64))
+                else:
+                    self.generator.generate(prompt).save(tmp_path, format="PNG")
+                os.replace(tmp_path, os.path.join(self.directory, name))
+            except Exception as e:
+                self.failures += 1
+                print(f"Image pool refill failed: {str(e)}")
+                time.sleep(RETRY_DELAY)
+                continue
+
+            with self._cond:
+                self._entries.append({"file": name, "prompt": prompt})
+                self._save_index()
+                self.generated += 1
+                self._cond.notify_all()
+
+    def take(self, timeout=WAIT_TIMEOUT):
+        """
+        Removes the oldest ready image and returns (png_bytes, prompt).
+        Waits up to `timeout` seconds when the pool is empty; returns None
+        if nothing became ready in time.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._entries, timeout=timeout):
+                return None
+            entry = self._entries.pop(0)
+            self._save_index()
+            self.served += 1
+            self._cond.notify_all()  # wake the refill thread
+
+        path = os.path.join(self.directory, entry["file"])
+        with open(path, "rb") as f:
+            png_bytes = f.read()
+        os.remove(path)
+        return png_bytes, entry["prompt"]
+
+    def stats(self):
+        with self._cond:
+            ready = len(self._entries)
+        return {
+            "ready": ready,
+            "size": self.size,
+            "generated": self.generated,
+            "served": self.served,
+            "failures": self.failures,
+        }
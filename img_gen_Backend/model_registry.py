@@ -0,0 +1,238 @@
+import os
+import threading
+
+import pandas as pd
+
+# -----------------------
+# Roles served by this process
+# -----------------------
+# "image" serves /generate-image and /jobs (Stable Diffusion); "grammar"
+# serves /check-grammar and /check-similarity (T5, LanguageTool, TF-IDF).
+# A process only ever loads the models its roles need, so grammar-only
+# workers never load the diffusion pipeline.
+ALL_ROLES = ("image", "grammar")
+SERVICE_ROLES = tuple(
+    role.strip() for role in os.environ.get("SERVICE_ROLES", ",".join(ALL_ROLES)).split(",") if role.strip()
+)
+
+GRAMMAR_MODEL_PATH = "models/grammar_model"
+CSV_PATH = "Dataset_Image_gen.csv"  # Correct for Docker
+
+# Components each role needs before it is ready. Weights are plain tensors
+# and data, safe to load before forking; services own threads (batcher,
+# pool refill, job workers) or a LanguageTool server and must be created
+# in the process that uses them.
+ROLE_WEIGHTS = {"image": ("prompts", "image_generator"), "grammar": ("prompts", "grammar_model")}
+ROLE_SERVICES = {
+    "image": ("image_cache", "image_pool", "image_jobs"),
+    "grammar": ("similarity_index", "grammar_corrector", "languagetool"),
+}
+
+_models = {}
+_errors = {}
+_locks = {}
+_lock = threading.Lock()
+_ready = threading.Event()
+
+for _role in SERVICE_ROLES:
+    if _role not in ALL_ROLES:
+        raise ValueError(f"Unknown service role: {_role}")
+
+
+def serves(role):
+    return role in SERVICE_ROLES
+
+
+def _load_once(name, loader):
+    """
+    Returns the component registered under `name`, loading it on first use.
+    """
+    model = _models.get(name)
+    if model is None:
+        # One lock per component: loaders call each other, and loading the
+        # diffusion pipeline must not hold up a request for the grammar model
+        with _lock:
+            name_lock = _locks.setdefault(name, threading.Lock())
+        with name_lock:
+            model = _models.get(name)
+            if model is None:
+                try:
+                    model = loader()
+                except Exception as e:
+                    _errors[name] = str(e)
+                    raise
+                _errors.pop(name, None)
+                _models[name] = model
+    return model
+
+
+def _load_prompts():
+    df = pd.read_csv(CSV_PATH)
+    return df.iloc[:, 0].tolist()  # Assuming the prompts are in the first column
+
+
+def _load_grammar_model():
+    from transformers import T5ForConditionalGeneration, T5Tokenizer
+
+    tokenizer = T5Tokenizer.from_pretrained(GRAMMAR_MODEL_PATH)
+    model = T5ForConditionalGeneration.from_pretrained(GRAMMAR_MODEL_PATH)
+    return tokenizer, model.eval()
+
+
+def _load_image_generator():
+    from authtoken import auth_token
+    from image_generator import ImageGenerator
+
+    return ImageGenerator(auth_token)
+
+
+def _load_grammar_corrector():
+    from utils.grammar import GrammarCorrector
+
+    return GrammarCorrector(*get_grammar_model())
+
+
+def _load_similarity_index():
+    from utils.similarity import PromptSimilarityIndex
+
+    return PromptSimilarityIndex(get_prompts())
+
+
+def _load_languagetool():
+    from utils.feedback import get_tool
+
+    return get_tool()
+
+
+def _load_image_cache():
+    from image_cache import ImageCache
+
+    return ImageCache()
+
+
+def _load_image_pool():
+    from image_pool import ImagePool
+
+    image_pool = ImagePool(get_image_generator(), get_prompts(), cache=get_image_cache())
+    image_pool.start()
+    return image_pool
+
+
+def _load_image_jobs():
+    from image_jobs import JobManager
+
+    return JobManager(get_image_generator(), get_prompts(), cache=get_image_cache())
+
+
+def get_prompts():
+    return _load_once("prompts", _load_prompts)
+
+
+def get_grammar_model():
+    """
+    Returns the shared (T5Tokenizer, T5ForConditionalGeneration) pair.
+    """
+    return _load_once("grammar_model", _load_grammar_model)
+
+
+def get_image_generator():
+    return _load_once("image_generator", _load_image_generator)
+
+
+def get_grammar_corrector():
+    return _load_once("grammar_corrector", _load_grammar_corrector)
+
+
+def get_similarity_index():
+    return _load_once("similarity_index", _load_similarity_index)
+
+
+def get_languagetool():
+    return _load_once("languagetool", _load_languagetool)
+
+
+def get_image_cache():
+    return _load_once("image_cache", _load_image_cache)
+
+
+def get_image_pool():
+    return _load_once("image_pool", _load_image_pool)
+
+
+def get_image_jobs():
+    return _load_once("image_jobs", _load_image_jobs)
+
+
+_LOADERS = {
+    "prompts": get_prompts,
+    "grammar_model": get_grammar_model,
+    "image_generator": get_image_generator,
+    "grammar_corrector": get_grammar_corrector,
+    "similarity_index": get_similarity_index,
+    "languagetool": get_languagetool,
+    "image_cache": get_image_cache,
+    "image_pool": get_image_pool,
+    "image_jobs": get_image_jobs,
+}
+
+
+def _components(table):
+    return list(dict.fromkeys(name for role in SERVICE_ROLES for name in table[role]))
+
+
+def preload_weights():
+    """
+    Loads the weights and data for this process's roles without starting
+    any threads or running inference, so it is safe to call in a server's
+    master process before workers are forked: the children then share the
+    weight pages copy-on-write instead of each loading its own copy.
+    """
+    for name in _components(ROLE_WEIGHTS):
+        _LOADERS[name]()
+
+
+def start_services():
+    """
+    Creates this process's services (loading any weights not preloaded)
+    and warms them up, then marks the process ready. Call once per worker,
+    after forking.
+    """
+    preload_weights()
+    for name in _components(ROLE_SERVICES):
+        _LOADERS[name]()
+
+    # Warm LanguageTool and the grammar model so the first request is not slow
+    if serves("grammar"):
+        from utils.feedback import warm_up
+
+        warm_up(get_grammar_corrector())
+    _ready.set()
+
+
+def start_services_in_background():
+    """Runs start_services() on a thread; readiness() reports when it is done."""
+    def run():
+        try:
+            start_services()
+        except Exception as e:
+            print(f"Starting services failed: {str(e)}")
+
+    threading.Thread(target=run, name="model-loader", daemon=True).start()
+
+
+def loaded(name):
+    """Returns the component if it has been loaded, without loading it."""
+    return _models.get(name)
+
+
+def readiness():
+    """Returns (ready, {component: "loaded" | "loading" | "failed: ..."}) for this process's roles."""
+    components = {}
+    for name in _components(ROLE_WEIGHTS) + _components(ROLE_SERVICES):
+        if name in _models:
+            components[name] = "loaded"
+        elif name in _errors:
+            components[name] = f"failed: {_errors[name]}"
+        else:
+            components[name] = "loading"
+    return _ready.is_set(), components
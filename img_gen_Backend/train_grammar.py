@@ -1,52 +1,13 @@
 from transformers import T5ForConditionalGeneration, T5Tokenizer, Trainer, TrainingArguments
 from transformers import DataCollatorForSeq2Seq
-from torch.utils.data import Dataset
-import torch
-
-class GrammarDataset(Dataset):
-    def __init__(self, file_path, tokenizer, max_length=128):
-        self.data = []
-        with open(file_path, 'r') as f:
-            for line in f:
-                inc, cor = line.strip().split('\t')
-                self.data.append((inc, cor))
-        
-        self.tokenizer = tokenizer
-        self.max_length = max_length
-
-    def __len__(self):
-        return len(self.data)
-
-    def __getitem__(self, idx):
-        src = f"grammar: {self.data[idx][0]}"
-        tgt = self.data[idx][1]
-        
-        inputs = self.tokenizer(
-            src, 
-            max_length=self.max_length,
-            truncation=True,
-            padding='max_length'
-        )
-        
-        targets = self.tokenizer(
-            tgt,
-            max_length=self.max_length,
-            truncation=True,
-            padding='max_length'
-        )
-        
-        return {
-            'input_ids': torch.tensor(inputs.input_ids),
-            'attention_mask': torch.tensor(inputs.attention_mask),
-            'labels': torch.tensor(targets.input_ids)
-        }
+from utils.data_loader import GrammarDataset
 
 def train_model():
     # Initialize model and tokenizer
     tokenizer = T5Tokenizer.from_pretrained("t5-small")
     model = T5ForConditionalGeneration.from_pretrained("t5-small")
     
-    # Load datasets
+    # Load datasets (tokenized once into data/tokenized, then memory-mapped)
     train_dataset = GrammarDataset("data/train.txt", tokenizer)
     val_dataset = GrammarDataset("data/val.txt", tokenizer)
     
@@ -62,6 +23,8 @@ def train_model():
         evaluation_strategy="epoch",
         save_strategy="epoch",
         load_best_model_at_end=True,
+        # Batch samples of similar length so dynamic padding adds little
+        group_by_length=True,
     )
     
     # Create trainer
@@ -70,7 +33,8 @@ def train_model():
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=val_dataset,
-        data_collator=DataCollatorForSeq2Seq(tokenizer)
+        # Pads each batch to its longest sample; padded labels are -100 and ignored by the loss
+        data_collator=DataCollatorForSeq2Seq(tokenizer, model=model)
     )
     
     # Start training
@@ -1,48 +1,159 @@
-from transformers import T5Tokenizer
+import json
+import os
+import shutil
+
+import numpy as np
 import torch
 
-class GrammarDataset(torch.utils.data.Dataset):
-    def __init__(self, file_path, tokenizer, max_length=128):
-        self.tokenizer = tokenizer
-        self.max_length = max_length
-        self.samples = []
-        
-        with open(file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if "|||" not in line:
-                    print(f"Skipping invalid line: {line}")  # Warning for debugging
-                    continue
-                
-                parts = line.split("|||")
-                if len(parts) != 2:
-                    print(f"Skipping malformed line: {line}")  # Handle unexpected format
-                    continue
-                
-                incorrect, correct = parts
-                self.samples.append((incorrect.strip(), correct.strip()))
-    
+TOKEN_CACHE_DIR = "data/tokenized"   # token arrays are written here, one subdirectory per corpus file
+TOKENIZE_CHUNK_SIZE = 1000           # lines tokenized per batched tokenizer call
+TOKEN_DTYPE = np.int32
+
+
+def read_pairs(file_path):
+    """
+    Reads (incorrect, correct) pairs from a corpus file. Lines are either
+    tab-separated (data/train.txt) or "incorrect ||| correct".
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            separator = "\t" if "\t" in line else "|||"
+            parts = line.split(separator)
+            if len(parts) != 2:
+                print(f"Skipping malformed line: {line}")  # Handle unexpected format
+                continue
+
+            incorrect, correct = parts
+            yield incorrect.strip(), correct.strip()
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _cache_meta(file_path, tokenizer, max_length):
+    # Everything that determines the token arrays; a mismatch means re-tokenize
+    stat = os.stat(file_path)
+    return {
+        "source": os.path.abspath(file_path),
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime,
+        "tokenizer": tokenizer.name_or_path,
+        "vocab_size": len(tokenizer),
+        "max_length": max_length,
+    }
+
+
+def tokenize_corpus(file_path, tokenizer, max_length=128, cache_dir=TOKEN_CACHE_DIR):
+    """
+    Tokenizes a corpus file once and stores it as flat token arrays on disk:
+    input_ids.bin and labels.bin hold every sample's tokens back to back,
+    and the matching *_offsets.npy give where each sample starts. Nothing
+    is padded; padding happens per batch in the collator.
+
+    Returns the directory. If it already holds arrays for the same file,
+    tokenizer and max_length, they are reused without tokenizing again.
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    directory = os.path.join(cache_dir, name)
+    meta = _cache_meta(file_path, tokenizer, max_length)
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            if json.load(f) == meta:
+                return directory
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    # Build into a temporary directory so an interrupted run never leaves a partial cache
+    tmp_directory = directory + ".tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    offsets = {"input_ids": [0], "labels": [0]}
+    with open(os.path.join(tmp_directory, "input_ids.bin"), "wb") as inputs_file, \
+            open(os.path.join(tmp_directory, "labels.bin"), "wb") as labels_file:
+        for chunk in _chunked(read_pairs(file_path), TOKENIZE_CHUNK_SIZE):
+            inputs = tokenizer([f"grammar: {src}" for src, _ in chunk], max_length=max_length, truncation=True)
+            targets = tokenizer([tgt for _, tgt in chunk], max_length=max_length, truncation=True)
+            for key, ids_list, out in (("input_ids", inputs.input_ids, inputs_file),
+                                       ("labels", targets.input_ids, labels_file)):
+                for ids in ids_list:
+                    offsets[key].append(offsets[key][-1] + len(ids))
+                np.fromiter((t for ids in ids_list for t in ids), dtype=TOKEN_DTYPE).tofile(out)
+
+    for key, values in offsets.items():
+        np.save(os.path.join(tmp_directory, f"{key}_offsets.npy"), np.asarray(values, dtype=np.int64))
+    with open(os.path.join(tmp_directory, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    return directory
+
+
+class TokenizedGrammarDataset(torch.utils.data.Dataset):
+    """
+    Reads samples from the token arrays written by tokenize_corpus().
+
+    The arrays are memory-mapped, so the dataset loads instantly, costs no
+    tokenization per epoch, and DataLoader workers share the OS page cache.
+    Samples are returned unpadded; use DataCollatorForSeq2Seq to pad each
+    batch to its own longest sample (labels are padded with -100, so
+    padding does not count towards the loss).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.input_ids = np.memmap(os.path.join(directory, "input_ids.bin"), dtype=TOKEN_DTYPE, mode="r")
+        self.labels = np.memmap(os.path.join(directory, "labels.bin"), dtype=TOKEN_DTYPE, mode="r")
+        self.input_offsets = np.load(os.path.join(directory, "input_ids_offsets.npy"))
+        self.label_offsets = np.load(os.path.join(directory, "labels_offsets.npy"))
+
     def __len__(self):
-        return len(self.samples)
-    
+        return len(self.input_offsets) - 1
+
     def __getitem__(self, idx):
-        src, tgt = self.samples[idx]
-        inputs = self.tokenizer(
-            f"grammar: {src}", 
-            max_length=self.max_length, 
-            truncation=True, 
-            padding="max_length",
-            return_tensors="pt"
-        )
-        targets = self.tokenizer(
-            tgt, 
-            max_length=self.max_length, 
-            truncation=True, 
-            padding="max_length",
-            return_tensors="pt"
-        )
+        input_ids = self.input_ids[self.input_offsets[idx]:self.input_offsets[idx + 1]].tolist()
+        labels = self.labels[self.label_offsets[idx]:self.label_offsets[idx + 1]].tolist()
         return {
-            "input_ids": inputs.input_ids.squeeze(),
-            "attention_mask": inputs.attention_mask.squeeze(),
-            "labels": targets.input_ids.squeeze()
+            "input_ids": input_ids,
+            "attention_mask": [1] * len(input_ids),
+            "labels": labels
         }
+
+
+class GrammarDataset(TokenizedGrammarDataset):
+    """A corpus file, tokenized on first use and read back from the token cache."""
+
+    def __init__(self, file_path, tokenizer, max_length=128, cache_dir=TOKEN_CACHE_DIR):
+        super().__init__(tokenize_corpus(file_path, tokenizer, max_length, cache_dir))
+
+
+if __name__ == "__main__":
+    # Pre-tokenize corpus files ahead of training:
+    #   python -m utils.data_loader data/train.txt data/val.txt
+    import argparse
+
+    from transformers import T5Tokenizer
+
+    parser = argparse.ArgumentParser(description="Tokenize grammar corpora into memory-mapped token arrays")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--tokenizer", default="t5-small")
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--cache-dir", default=TOKEN_CACHE_DIR)
+    args = parser.parse_args()
+
+    tokenizer = T5Tokenizer.from_pretrained(args.tokenizer)
+    for file_path in args.files:
+        directory = tokenize_corpus(file_path, tokenizer, args.max_length, args.cache_dir)
+        print(f"{file_path}: {len(TokenizedGrammarDataset(directory))} samples in {directory}")
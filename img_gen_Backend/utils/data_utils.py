@@ -1,8 +1,22 @@
 # utils/data_utils.py
+import argparse
+import hashlib
+import json
+import os
 import random
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.model_selection import train_test_split
 
+# Corpus generation settings
+CHUNK_SIZE = 10000          # base sentences per worker task
+SHARD_SIZE = 1000000        # pairs per output shard file
+MIN_WORDS = 3               # shorter or longer lines are skipped
+MAX_WORDS = 40
+VAL_FRACTION = 0.2
+DEDUP_BUCKETS = 256         # temporary hash-bucket files; dedup holds one bucket in memory at a time
+
 BASE_SENTENCES = [
     "The cat sits on the mat.",
     "She is reading an interesting book.",
@@ -30,18 +44,24 @@ ERROR_RULES = {
     ]
 }
 
-def introduce_errors(sentence):
+# Compiled once at import (and so once per worker process)
+COMPILED_RULES = {
+    error_type: [(re.compile(pattern, flags=re.IGNORECASE), replacement) for pattern, replacement in rules]
+    for error_type, rules in ERROR_RULES.items()
+}
+ERROR_TYPES = list(COMPILED_RULES.keys())
+
+def introduce_errors(sentence, rng=random):
     """Guarantee at least one error per sentence"""
     original = sentence
     attempts = 0
     
     while sentence == original and attempts < 5:
-        error_type = random.choice(list(ERROR_RULES.keys()))
-        pattern, replacement = random.choice(ERROR_RULES[error_type])
+        error_type = rng.choice(ERROR_TYPES)
+        pattern, replacement = rng.choice(COMPILED_RULES[error_type])
         
-        # Apply substitution only if pattern exists
-        if re.search(pattern, sentence, flags=re.IGNORECASE):
-            sentence = re.sub(pattern, replacement, sentence, flags=re.IGNORECASE)
+        # Substituting is a no-op when the pattern does not occur
+        sentence = pattern.sub(replacement, sentence)
         
         attempts += 1
     
@@ -77,5 +97,176 @@ def prepare_semantic_data():
     with open('data/val.txt', 'w') as f:
         f.write('\n'.join([f"{inc}\t{cor}" for inc, cor in val]))
 
+# -----------------------
+# Large corpus generation
+# -----------------------
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def iter_sentences(paths, min_words=MIN_WORDS, max_words=MAX_WORDS):
+    """Streams correct sentences from text files, one line at a time."""
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                for sentence in _SENTENCE_END.split(line.strip()):
+                    if min_words <= len(sentence.split()) <= max_words:
+                        yield sentence
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def pair_hash(line):
+    digest = hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def corrupt_chunk(chunk_index, sentences, seed, variants=1):
+    """
+    Worker task: up to `variants` incorrect versions of each sentence, as
+    (hash, "incorrect\tcorrect\n") so the parent only dedups and writes.
+    The random generator is seeded from (seed, chunk_index), so the output
+    does not depend on which process runs the chunk or in what order.
+    """
+    rng = random.Random(f"{seed}:{chunk_index}")
+    pairs = []
+    for sentence in sentences:
+        for _ in range(variants):
+            corrupted = introduce_errors(sentence, rng)
+            if not corrupted.startswith("ERROR:") and corrupted != sentence:
+                line = f"{corrupted}\t{sentence}\n"
+                pairs.append((pair_hash(line), line))
+    return pairs
+
+class ShardWriter:
+    """Writes "incorrect\tcorrect" lines as <prefix>-00000.txt, <prefix>-00001.txt, ... of at most shard_size lines."""
+
+    def __init__(self, output_dir, prefix, shard_size=SHARD_SIZE):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.shards = []
+        self.count = 0
+        self._file = None
+        self._in_shard = 0
+
+    def write(self, line):
+        if self._file is None or self._in_shard == self.shard_size:
+            self._open_next()
+        self._file.write(line)
+        self._in_shard += 1
+        self.count += 1
+
+    def _open_next(self):
+        self.close()
+        name = f"{self.prefix}-{len(self.shards):05d}.txt"
+        self.shards.append(name)
+        self._file = open(os.path.join(self.output_dir, name), "w", encoding="utf-8")
+        self._in_shard = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def generate_corpus(input_paths, output_dir, seed=0, workers=None, variants=1,
+                    chunk_size=CHUNK_SIZE, shard_size=SHARD_SIZE, val_fraction=VAL_FRACTION,
+                    dedup_buckets=DEDUP_BUCKETS):
+    """
+    Builds a train/val corpus of (incorrect, correct) pairs from text files.
+
+    Sentences are streamed from the input files in chunks and corrupted in
+    a process pool, with at most two chunks per worker in flight. Results
+    are consumed in chunk order, so a given seed always yields the same
+    corpus. Pairs are first spilled to `dedup_buckets` temporary files by
+    the top bits of their 64-bit hash; each bucket is then deduplicated on
+    its own, so the dedup state in memory is one bucket's hashes (about
+    1/dedup_buckets of the pairs), not the whole corpus. Each pair goes to
+    train or val by its hash, so the split is stable too. Output is written
+    into sharded files, with a manifest.json listing the shards.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    bucket_dir = os.path.join(output_dir, "buckets.tmp")
+    os.makedirs(bucket_dir, exist_ok=True)
+    bucket_shift = 64 - (dedup_buckets - 1).bit_length()
+    bucket_paths = [os.path.join(bucket_dir, f"bucket-{b:05d}.txt") for b in range(dedup_buckets)]
+
+    # 1. Generate, spilling each pair to its hash bucket as "key\tincorrect\tcorrect"
+    workers = workers or os.cpu_count() or 1
+    buckets = [open(path, "w", encoding="utf-8") for path in bucket_paths]
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            chunks = enumerate(_chunks(iter_sentences(input_paths), chunk_size))
+            while True:
+                while len(in_flight) < 2 * workers:
+                    try:
+                        chunk_index, sentences = next(chunks)
+                    except StopIteration:
+                        break
+                    in_flight.append(executor.submit(corrupt_chunk, chunk_index, sentences, seed, variants))
+                if not in_flight:
+                    break
+
+                for key, line in in_flight.popleft().result():
+                    buckets[key >> bucket_shift].write(f"{key:016x}\t{line}")
+    finally:
+        for bucket in buckets:
+            bucket.close()
+
+    # 2. Deduplicate one bucket at a time and write the shards
+    writers = {"train": ShardWriter(output_dir, "train", shard_size),
+               "val": ShardWriter(output_dir, "val", shard_size)}
+    val_cutoff = int(val_fraction * 2 ** 64)
+    duplicates = 0
+    for path in bucket_paths:
+        seen = set()
+        with open(path, "r", encoding="utf-8") as f:
+            for record in f:
+                key_hex, line = record.split("\t", 1)
+                key = int(key_hex, 16)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                writers["val" if key < val_cutoff else "train"].write(line)
+        os.remove(path)
+    os.rmdir(bucket_dir)
+
+    for writer in writers.values():
+        writer.close()
+
+    manifest = {
+        "seed": seed,
+        "inputs": list(input_paths),
+        "duplicates_dropped": duplicates,
+        **{split: {"pairs": writer.count, "shards": writer.shards} for split, writer in writers.items()},
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
 if __name__ == '__main__':
-    prepare_semantic_data()
\ No newline at end of file
+    # Without arguments, regenerate the small data/train.txt and data/val.txt
+    # from BASE_SENTENCES. With text files, build a large sharded corpus:
+    #   python -m utils.data_utils corpus1.txt corpus2.txt --output data/corpus --seed 0
+    parser = argparse.ArgumentParser(description="Generate synthetic grammar-error training pairs")
+    parser.add_argument("inputs", nargs="*", help="text files of correct sentences")
+    parser.add_argument("--output", default="data/corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--variants", type=int, default=1, help="incorrect versions per sentence")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    if args.inputs:
+        manifest = generate_corpus(args.inputs, args.output, seed=args.seed, workers=args.workers,
+                                   variants=args.variants, shard_size=args.shard_size)
+        print(f"train: {manifest['train']['pairs']} pairs, val: {manifest['val']['pairs']} pairs, "
+              f"{manifest['duplicates_dropped']} duplicates dropped")
+    else:
+        prepare_semantic_data()
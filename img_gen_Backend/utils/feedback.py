@@ -1,30 +1,75 @@
 import difflib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import language_tool_python
 from transformers import T5ForConditionalGeneration, T5Tokenizer
+from utils.grammar import LRUCache, normalize_sentence, split_sentences
 
-# Initialize LanguageTool
-tool = language_tool_python.LanguageTool('en-US')
-
-# Grammar correction using your trained model
-def correct_grammar(text, tokenizer, model):
-    inputs = tokenizer(
-        f"grammar: {text}",
-        return_tensors="pt",
-        max_length=128,
-        truncation=True
-    )
-    outputs = model.generate(**inputs)
-    corrected = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    return corrected
+# LanguageTool starts a local Java server on first use, one per process.
+# Set LANGUAGETOOL_SERVER (e.g. http://languagetool:8010) to share one
+# server between all workers instead.
+LANGUAGETOOL_SERVER = os.environ.get("LANGUAGETOOL_SERVER")
+
+_tool = None
+_tool_lock = threading.Lock()
+
+def get_tool():
+    global _tool
+    with _tool_lock:
+        if _tool is None:
+            _tool = language_tool_python.LanguageTool('en-US', remote_server=LANGUAGETOOL_SERVER)
+        return _tool
+
+# LanguageTool matches per normalized sentence; common sentences repeat across students
+CHECK_CACHE_SIZE = 4096
+check_cache = LRUCache(CHECK_CACHE_SIZE)
+
+# Runs LanguageTool checks alongside the T5 correction
+_check_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="languagetool")
+
+# Check a text with LanguageTool, sentence by sentence through the cache.
+# Uncached sentences go to the server together in a single check.
+def check_text(text):
+    keys = [normalize_sentence(sentence) for sentence in split_sentences(text)]
+    cached = {key: check_cache.get(key) for key in dict.fromkeys(keys)}
+    missing = [key for key, matches in cached.items() if matches is None]
+
+    if missing:
+        starts, offset = [], 0
+        for key in missing:
+            starts.append(offset)
+            offset += len(key) + 1
+        found = {key: [] for key in missing}
+        for match in get_tool().check(" ".join(missing)):
+            # Attribute each match to the sentence it starts in
+            index = max(i for i, start in enumerate(starts) if start <= match.offset)
+            found[missing[index]].append(match)
+        for key, matches in found.items():
+            check_cache.put(key, matches)
+            cached[key] = matches
+
+    return [match for key in keys for match in cached[key]]
+
+# Start LanguageTool's JVM work and the grammar model before the first request
+def warm_up(corrector=None):
+    get_tool().check("This is a warm up sentence.")
+    if corrector is not None:
+        corrector.correct("This is a warm up sentence.")
+
+# Grammar correction using your trained model (batched, see utils/grammar.py)
+def correct_grammar(text, corrector):
+    return corrector.correct(text)
 
 # Generate feedback
-def generate_feedback(original, tokenizer, model):
+def generate_feedback(original, corrector):
     """Generate feedback using both LanguageTool and your trained model"""
-    # Step 1: Correct grammar using your model
-    corrected = correct_grammar(original, tokenizer, model)
-    
-    # Step 2: Check grammar errors using LanguageTool
-    matches = tool.check(original)
+    # Step 1: Check grammar errors using LanguageTool, in the background
+    check = _check_executor.submit(check_text, original)
+
+    # Step 2: Meanwhile, correct grammar using your model
+    corrected = correct_grammar(original, corrector)
+    matches = check.result()
     
     # Step 3: Format the feedback
     feedback = "Feedback Report!✨\n"
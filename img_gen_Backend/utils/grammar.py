@@ -0,0 +1,167 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import torch
+
+MAX_LENGTH = 128          # token limit the grammar model was trained with
+MAX_BATCH_SIZE = 16       # sentences per generate() call
+MAX_WAIT_MS = 10          # how long a request waits for others to join its batch
+MAX_NEW_TOKENS_MARGIN = 16  # corrections are about as long as their input
+CORRECTION_CACHE_SIZE = 4096  # corrected sentences remembered across requests
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text):
+    return [s for s in _SENTENCE_END.split(text.strip()) if s]
+
+
+def normalize_sentence(sentence):
+    # Cache key: the same sentence typed with different spacing is the same input
+    return " ".join(sentence.split())
+
+
+class LRUCache:
+    """A small thread-safe LRU mapping with hit/miss counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class GrammarCorrector:
+    """
+    Batched grammar correction with the T5 model.
+
+    Texts are split into sentences, and sentences longer than the model's
+    MAX_LENGTH are further split into word chunks, so nothing is truncated.
+    The sentences of all pending texts are sorted by length and corrected
+    in padded batches under inference mode, then reassembled per text.
+
+    correct() may be called from many request threads at once: a batcher
+    thread gathers the requests that arrive within MAX_WAIT_MS and corrects
+    them together. Corrected sentences are cached, so repeated sentences
+    skip the model entirely.
+    """
+
+    def __init__(self, tokenizer, model, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.tokenizer = tokenizer
+        self.model = model.eval()
+        self.cache = LRUCache(CORRECTION_CACHE_SIZE)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._batch_loop, name="grammar-batcher", daemon=True)
+        self._thread.start()
+
+    def _prefixed_length(self, text):
+        return len(self.tokenizer(f"grammar: {text}").input_ids)
+
+    def _chunks(self, sentence):
+        # Split over-long sentences on word boundaries so each chunk fits MAX_LENGTH
+        if self._prefixed_length(sentence) <= MAX_LENGTH:
+            return [sentence]
+        chunks, current = [], []
+        for word in sentence.split():
+            if current and self._prefixed_length(" ".join(current + [word])) > MAX_LENGTH:
+                chunks.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+
+    def correct_many(self, texts):
+        """Corrects several texts in length-bucketed batches; returns one string per text."""
+        pieces = []  # (text index, sentence)
+        for i, text in enumerate(texts):
+            for sentence in split_sentences(text):
+                pieces.extend((i, normalize_sentence(chunk)) for chunk in self._chunks(sentence))
+
+        corrections = {}
+        for _, sentence in pieces:
+            if sentence not in corrections:
+                corrections[sentence] = self.cache.get(sentence)
+
+        # Each distinct sentence is generated once, however many texts share it;
+        # sorting by length keeps the padding in each batch small
+        order = sorted((s for s, c in corrections.items() if c is None), key=len)
+        for start in range(0, len(order), self.max_batch_size):
+            batch = order[start:start + self.max_batch_size]
+            inputs = self.tokenizer(
+                [f"grammar: {sentence}" for sentence in batch],
+                return_tensors="pt",
+                padding=True,
+                max_length=MAX_LENGTH,
+                truncation=True
+            )
+            with torch.inference_mode():
+                outputs = self.model.generate(
+                    **inputs,
+                    max_new_tokens=inputs.input_ids.shape[1] + MAX_NEW_TOKENS_MARGIN
+                )
+            for sentence, output in zip(batch, self.tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+                corrections[sentence] = output.strip()
+                self.cache.put(sentence, corrections[sentence])
+
+        results = [[] for _ in texts]
+        for i, sentence in pieces:
+            results[i].append(corrections[sentence])
+        return [" ".join(sentences) for sentences in results]
+
+    def correct(self, text):
+        """Corrects one text, batched together with concurrent callers."""
+        future = Future()
+        with self._cond:
+            self._pending.append((text, future))
+            self._cond.notify()
+        return future.result()
+
+    def _batch_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Give concurrent requests a moment to join this batch
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                requests, self._pending = self._pending, []
+
+            try:
+                results = self.correct_many([text for text, _ in requests])
+                for (_, future), result in zip(requests, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
@@ -0,0 +1,77 @@
+from collections import Counter
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+SIMILARITY_MODE = "tfidf"                   # "tfidf" or "embedding"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"        # used by the optional sentence-transformers mode
+
+
+class PromptSimilarityIndex:
+    """
+    Scores a student's description against an image prompt.
+
+    Built once at startup from every prompt in the dataset. In "tfidf" mode
+    the vectorizer is fitted on the whole prompt corpus, so IDF weights
+    reflect how distinctive each word is across prompts, and the
+    L2-normalized prompt matrix is precomputed; a request transforms only
+    the user text and takes one sparse dot product. Words in the text that
+    never occur in any prompt still count towards its norm (with the
+    highest IDF), so padding a description with unrelated words lowers
+    the score as it should.
+
+    In "embedding" mode prompts are encoded once with sentence-transformers
+    (an optional dependency) and scores are cosine similarities of
+    sentence embeddings.
+    """
+
+    def __init__(self, prompts, mode=SIMILARITY_MODE):
+        self.mode = mode
+        self.prompts = list(prompts)
+        self._rows = {prompt: i for i, prompt in enumerate(self.prompts)}
+
+        if mode == "tfidf":
+            self.vectorizer = TfidfVectorizer(stop_words='english', norm=None)
+            self.prompt_matrix = normalize(self.vectorizer.fit_transform(self.prompts))
+            self._analyzer = self.vectorizer.build_analyzer()
+            self._unseen_idf = float(self.vectorizer.idf_.max())
+        elif mode == "embedding":
+            from sentence_transformers import SentenceTransformer
+
+            self.model = SentenceTransformer(EMBEDDING_MODEL)
+            self.prompt_matrix = self._embed(self.prompts)
+        else:
+            raise ValueError(f"Unknown similarity mode: {mode}")
+
+    def _embed(self, texts):
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+    def _prompt_vector(self, prompt):
+        row = self._rows.get(prompt)
+        if row is not None:
+            return self.prompt_matrix[row]
+        # A prompt outside the dataset is embedded on the fly
+        return self._embed([prompt])[0]
+
+    def _tfidf_text(self, text):
+        # TF-IDF vector over the prompt vocabulary, and the norm over all of the text's words
+        vector = self.vectorizer.transform([text])
+        unseen = sum(count ** 2 for term, count in Counter(self._analyzer(text)).items()
+                     if term not in self.vectorizer.vocabulary_)
+        norm = np.sqrt(vector.multiply(vector).sum() + unseen * self._unseen_idf ** 2)
+        return vector, norm
+
+    def score(self, prompt, text):
+        """Cosine similarity in [0, 1] between the prompt and the user's text."""
+        if self.mode == "tfidf":
+            if prompt not in self._rows:
+                # The index's vocabulary cannot represent an unknown prompt; compare the pair directly
+                vectors = TfidfVectorizer(stop_words='english').fit_transform([prompt, text])
+                return float(vectors[0].multiply(vectors[1]).sum())
+            prompt_vector = self.prompt_matrix[self._rows[prompt]]
+            vector, norm = self._tfidf_text(text)
+            if norm == 0:
+                return 0.0
+            return float(prompt_vector.multiply(vector).sum() / norm)
+        return float(max(0.0, np.dot(self._prompt_vector(prompt), self._embed([text])[0])))